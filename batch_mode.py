@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Batch Mode for Mini-Claude
+Submits backlog tasks as asynchronous message batches instead of one
+request per task
+"""
+
+import json
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Callable, Iterator
+from dataclasses import dataclass, field, asdict
+from abc import ABC, abstractmethod
+
+from mini_claude import Task, TaskExecutor, SecurityGuardrails, ActivityLogger
+
+@dataclass
+class BatchResult:
+    """Result of one request in a message batch"""
+    custom_id: str
+    text: Optional[str] = None
+    error: Optional[str] = None
+    usage: Dict[str, int] = field(default_factory=dict)
+
+class BatchTransport(ABC):
+    """Abstract base class for batch transports"""
+
+    @abstractmethod
+    def submit(self, requests: List[Dict[str, Any]]) -> str:
+        """Submit requests ({"custom_id", "params"}) and return a batch ID"""
+        pass
+
+    @abstractmethod
+    def is_done(self, batch_id: str) -> bool:
+        pass
+
+    @abstractmethod
+    def results(self, batch_id: str) -> Iterator[BatchResult]:
+        pass
+
+class AnthropicBatchTransport(BatchTransport):
+    """Message Batches API transport"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def submit(self, requests: List[Dict[str, Any]]) -> str:
+        batch = self.client.messages.batches.create(requests=requests)
+        return batch.id
+
+    def is_done(self, batch_id: str) -> bool:
+        batch = self.client.messages.batches.retrieve(batch_id)
+        return batch.processing_status == "ended"
+
+    def results(self, batch_id: str) -> Iterator[BatchResult]:
+        for entry in self.client.messages.batches.results(batch_id):
+            result = entry.result
+            if result.type == "succeeded" and result.message.stop_reason == "max_tokens":
+                # A cut-off response would be stored as complete code
+                yield BatchResult(custom_id=entry.custom_id, error="Response truncated at max_tokens")
+            elif result.type == "succeeded":
+                usage = {}
+                for name in ["input_tokens", "output_tokens",
+                             "cache_creation_input_tokens", "cache_read_input_tokens"]:
+                    usage[name] = getattr(result.message.usage, name, 0) or 0
+                yield BatchResult(
+                    custom_id=entry.custom_id,
+                    text=result.message.content[0].text,
+                    usage=usage
+                )
+            elif result.type == "errored":
+                yield BatchResult(custom_id=entry.custom_id, error=f"Batch request failed: {result.error}")
+            else:
+                yield BatchResult(custom_id=entry.custom_id, error=f"Batch request {result.type}")
+
+class LocalBatchTransport(BatchTransport):
+    """In-process fake batch server for tests and offline runs
+
+    Requests are answered by responder (echoes the prompt by default) and
+    a batch ends after polls_until_done calls to is_done.
+    """
+
+    def __init__(self, responder: Optional[Callable[[Dict[str, Any]], str]] = None,
+                 polls_until_done: int = 1):
+        self.responder = responder or self._echo
+        self.polls_until_done = polls_until_done
+        self.batches: Dict[str, Dict[str, Any]] = {}
+
+    def _echo(self, params: Dict[str, Any]) -> str:
+        return params["messages"][-1]["content"]
+
+    def submit(self, requests: List[Dict[str, Any]]) -> str:
+        batch_id = f"local_batch_{uuid.uuid4().hex[:12]}"
+        self.batches[batch_id] = {"requests": list(requests), "polls": 0}
+        return batch_id
+
+    def is_done(self, batch_id: str) -> bool:
+        batch = self.batches[batch_id]
+        batch["polls"] += 1
+        return batch["polls"] >= self.polls_until_done
+
+    def results(self, batch_id: str) -> Iterator[BatchResult]:
+        for request in self.batches.pop(batch_id)["requests"]:
+            try:
+                yield BatchResult(custom_id=request["custom_id"], text=self.responder(request["params"]))
+            except Exception as e:
+                yield BatchResult(custom_id=request["custom_id"], error=str(e))
+
+class BatchProcessor:
+    """Groups eligible pending tasks into message batches and writes back results
+
+    Claimed tasks are buffered until max_batch_size is reached or the oldest
+    one has waited max_wait seconds. Submitted batches are tracked in
+    state_file so a restarted daemon keeps polling them.
+    """
+
+    def __init__(self, queue, executor: TaskExecutor, transport: BatchTransport,
+                 logger: ActivityLogger, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.queue = queue
+        self.executor = executor
+        self.transport = transport
+        self.logger = logger
+        self.task_types = config.get("task_types", ["generate_docs"])
+        self.max_batch_size = config.get("max_batch_size", 1000)
+        self.max_wait = config.get("max_wait", 60)
+        self.poll_interval = config.get("poll_interval", 30)
+        self.state_file = Path(config.get("state_file", "pending_batches.json"))
+
+        self.buffer: List[Task] = []
+        self.buffer_started: Optional[float] = None
+        self.last_poll = 0.0
+        self.batches: Dict[str, Dict[str, Dict[str, Any]]] = self._load_state()
+
+    def _load_state(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Load outstanding batches from the state file"""
+        if self.state_file.exists():
+            with open(self.state_file, 'r') as f:
+                return json.load(f)
+        return {}
+
+    def _save_state(self):
+        """Persist outstanding batches"""
+        with open(self.state_file, 'w') as f:
+            json.dump(self.batches, f, indent=2)
+
+    def tick(self):
+        """Claim eligible tasks, flush a full or stale buffer and poll batches"""
+        room = self.max_batch_size - len(self.buffer)
+        if room > 0:
+            claimed = self.queue.claim_batch(room, self.task_types)
+            if claimed and not self.buffer:
+                self.buffer_started = time.time()
+            self.buffer.extend(claimed)
+
+        if self.buffer and (len(self.buffer) >= self.max_batch_size or
+                            time.time() - self.buffer_started >= self.max_wait):
+            self.flush()
+
+        if self.batches and time.time() - self.last_poll >= self.poll_interval:
+            self.poll()
+
+    def flush(self):
+        """Submit all buffered tasks as one batch"""
+        tasks, self.buffer, self.buffer_started = self.buffer, [], None
+        requests = []
+        submitted = {}
+
+        for task in tasks:
+            self.logger.log_task_start(task)
+            if not SecurityGuardrails.validate_task(task):
+                task.status = "failed"
+                task.error = "Security violation detected"
+                self.logger.log_security_violation(task, task.error)
+                self._store(task)
+                continue
+
+            budget = self.executor.budget
+            try:
+                system, prompt = self.executor.build_prompt(task)
+                max_tokens = budget.max_tokens_for(task.task_type)
+                input_tokens = budget.estimate_prompt(system, prompt)
+                if not budget.fits(input_tokens, max_tokens):
+                    raise ValueError(
+                        f"Input too large: ~{input_tokens} tokens plus max_tokens={max_tokens} "
+                        f"exceeds the {budget.context_window} token context window"
+                    )
+            except Exception as e:
+                self._fail(task, str(e))
+                continue
+
+            requests.append({
+                "custom_id": task.id,
+                "params": self.executor.llm.build_request(prompt, max_tokens, system)
+            })
+            # Keep the whole claimed task, so the one completed after the batch
+            # returns has its parameters, priority, created_at and attempts
+            submitted[task.id] = asdict(task)
+
+        if not requests:
+            return
+
+        try:
+            batch_id = self.transport.submit(requests)
+        except Exception as e:
+            for info in submitted.values():
+                self._fail(self._task_from_state(info), f"Batch submission failed: {e}")
+            return
+
+        self.batches[batch_id] = submitted
+        self._save_state()
+        self.logger.logger.info(f"BATCH_SUBMITTED: {batch_id} - {len(requests)} tasks")
+
+    def poll(self):
+        """Collect results of finished batches"""
+        self.last_poll = time.time()
+        for batch_id in list(self.batches):
+            try:
+                if not self.transport.is_done(batch_id):
+                    continue
+
+                submitted = self.batches[batch_id]
+                for result in self.transport.results(batch_id):
+                    info = submitted.pop(result.custom_id, None)
+                    if info:
+                        self._complete(self._task_from_state(info), result)
+
+                for info in submitted.values():
+                    self._fail(self._task_from_state(info), "Missing from batch results")
+            except Exception as e:
+                self.logger.log_error(batch_id, f"Batch polling failed: {e}")
+                continue
+
+            del self.batches[batch_id]
+            self._save_state()
+            self.logger.logger.info(f"BATCH_COMPLETE: {batch_id}")
+
+    def task_ids(self) -> List[str]:
+        """IDs of buffered and submitted tasks, whose leases must be kept alive"""
+        task_ids = [task.id for task in self.buffer]
+        for submitted in self.batches.values():
+            task_ids.extend(submitted)
+        return task_ids
+
+    def drain(self):
+        """Submit any buffered tasks before shutdown"""
+        if self.buffer:
+            self.flush()
+        if self.batches:
+            self.logger.logger.info(
+                f"{len(self.batches)} batches still running, will resume polling on next start"
+            )
+
+    def _task_from_state(self, info: Dict[str, Any]) -> Task:
+        # State files written before whole tasks were kept only have id,
+        # description and task_type
+        return Task(**{"parameters": {}, **info, "status": "processing"})
+
+    def _complete(self, task: Task, result: BatchResult):
+        if result.error is not None:
+            self._fail(task, result.error)
+            return
+
+        task.usage = result.usage
+        self.executor.observe_output(task, task.usage)
+        if self.executor.complete_task(task, result.text):
+            self.logger.log_task_complete(task)
+        self._store(task)
+
+    def _store(self, task: Task):
+        if not self.queue.update_task_status(task):
+            # The lease ran out and the task was requeued or claimed again
+            self.logger.logger.warning(f"TASK_STALE: {task.id} - lease lost, result dropped")
+
+    def _fail(self, task: Task, error: str):
+        task.status = "failed"
+        task.error = error
+        task.completed_at = datetime.now().isoformat()
+        self.logger.log_error(task.id, error)
+        self._store(task)
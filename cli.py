@@ -9,6 +9,7 @@ import sys
 import json
 import argparse
 import subprocess
+import time
 from pathlib import Path
 from typing import Dict, Any, List
 
@@ -23,8 +24,7 @@ def setup_environment():
         default_config = {
             "anthropic_api_key": "",
             "model": "claude-3-haiku-20240307",
-            "max_concurrent_tasks": 3,
-            "check_interval": 5
+            "max_concurrent_tasks": 3
         }
         with open(config_path, 'w') as f:
             json.dump(default_config, f, indent=2)
@@ -45,96 +45,161 @@ def setup_environment():
     
     print("Setup complete!")
 
+def _rpc_client(args):
+    """Connect to a running RPC server unless --no-server was given"""
+    if getattr(args, "no_server", False):
+        return None
+    from rpc_server import RPCClient
+    return RPCClient.connect(args.socket)
+
 def run_single_task(args):
     """Run a single task"""
-    cmd = [
-        "python", "mini_claude.py",
-        "--task", args.task,
-        "--type", args.type
-    ]
-    
+    parameters = {}
     if args.file:
-        cmd.extend(["--file", args.file])
+        parameters["file_path"] = args.file
     if args.code:
-        cmd.extend(["--code", args.code])
+        parameters["code"] = args.code
+    if args.no_cache:
+        parameters["no_cache"] = True
     
+    # Streaming needs a direct connection to the LLM, so it always runs in-process
+    client = None if args.stream else _rpc_client(args)
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        print(result.stdout)
-        if result.stderr:
-            print("Errors:", result.stderr, file=sys.stderr)
-    except subprocess.CalledProcessError as e:
+        if client:
+            result = client.call("task", description=args.task, task_type=args.type,
+                                 parameters=parameters)
+        else:
+            from mini_claude import MiniClaude
+            on_chunk = None
+            if args.stream:
+                def on_chunk(text):
+                    sys.stderr.write(text)
+                    sys.stderr.flush()
+            
+            result = MiniClaude().execute_single_task(args.task, args.type, on_chunk=on_chunk, **parameters)
+            if args.stream:
+                sys.stderr.write("\n")
+        print(json.dumps(result, indent=2))
+    except Exception as e:
         print(f"Task failed: {e}", file=sys.stderr)
-        if e.stdout:
-            print("Output:", e.stdout)
-        if e.stderr:
-            print("Errors:", e.stderr, file=sys.stderr)
 
 def start_daemon(args):
     """Start Mini-Claude daemon"""
     print("Starting Mini-Claude daemon...")
-    cmd = ["python", "mini_claude.py", "--daemon"]
     
-    if args.config:
-        cmd.extend(["--config", args.config])
+    # Run in background if requested
+    if args.background:
+        cmd = [sys.executable, "mini_claude.py", "--daemon"]
+        if args.config:
+            cmd.extend(["--config", args.config])
+        subprocess.Popen(cmd)
+        print("Daemon started in background")
+        return
     
     try:
-        # Run in background if requested
-        if args.background:
-            subprocess.Popen(cmd)
-            print("Daemon started in background")
-        else:
-            subprocess.run(cmd)
+        from mini_claude import MiniClaude
+        MiniClaude(args.config or "config.json").start_daemon_mode()
     except KeyboardInterrupt:
         print("\nDaemon stopped")
 
+def start_server(args):
+    """Start the local RPC server"""
+    if args.background:
+        cmd = [sys.executable, "rpc_server.py", "--socket", args.socket]
+        if args.config:
+            cmd.extend(["--config", args.config])
+        subprocess.Popen(cmd)
+        print(f"RPC server started in background on {args.socket}")
+        return
+    
+    from rpc_server import RPCServer
+    RPCServer(args.socket, args.config or "config.json").serve_forever()
+
 def manage_queue(args):
     """Manage task queue"""
-    cmd = ["python", "task_queue.py"]
-    
-    if args.backend:
-        cmd.extend(["--backend", args.backend])
-    
-    if args.submit:
-        cmd.extend(["--submit", args.submit])
-        if args.type:
-            cmd.extend(["--type", args.type])
-    elif args.list:
-        cmd.append("--list")
-        if args.status:
-            cmd.extend(["--status", args.status])
-    elif args.get:
-        cmd.extend(["--get", args.get])
+    # Stats, counts, compaction and JSONL submits from stdin always run in-process
+    client = (None if args.stats or args.count or args.compact or args.submit == "-"
+              else _rpc_client(args))
+    if not client:
+        # No warm server, run the queue CLI in-process
+        import task_queue
+        
+        argv = ["--backend", args.backend]
+        if args.submit:
+            argv.extend(["--submit", args.submit, "--type", args.type,
+                         "--priority", str(args.priority)])
+            if args.delay:
+                argv.extend(["--delay", str(args.delay)])
+        elif args.list:
+            argv.append("--list")
+            if args.status:
+                argv.extend(["--status", args.status])
+        elif args.count:
+            argv.append("--count")
+            if args.status:
+                argv.extend(["--status", args.status])
+        elif args.get:
+            argv.extend(["--get", args.get])
+        elif args.result:
+            argv.extend(["--result", args.result])
+        elif args.stats:
+            argv.append("--stats")
+        elif args.compact:
+            argv.extend(["--compact", "--retention-days", str(args.retention_days)])
+        
+        try:
+            task_queue.main(argv)
+        except Exception as e:
+            print(f"Queue operation failed: {e}", file=sys.stderr)
+        return
     
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        print(result.stdout)
-        if result.stderr:
-            print("Errors:", result.stderr, file=sys.stderr)
-    except subprocess.CalledProcessError as e:
+        if args.submit:
+            run_at = time.time() + args.delay if args.delay else None
+            task_id = client.call("submit", description=args.submit, task_type=args.type,
+                                  priority=args.priority, run_at=run_at, backend=args.backend)
+            print(f"Task submitted: {task_id}")
+        elif args.list:
+            # Rows stream from the server as the queue pages through them
+            count = 0
+            for task in client.stream("list", status=args.status, backend=args.backend):
+                print(f"  {task['id']}: {task['status']} - {task['description']}")
+                count += 1
+            print(f"Found {count} tasks")
+        elif args.get:
+            status = client.call("get", task_id=args.get, backend=args.backend)
+            if status:
+                print(json.dumps(status, indent=2))
+            else:
+                print(f"Task {args.get} not found")
+        elif args.result:
+            result = client.call("result", task_id=args.result, backend=args.backend)
+            if result is not None:
+                print(result)
+            else:
+                print(f"No result for task {args.result}")
+    except Exception as e:
         print(f"Queue operation failed: {e}", file=sys.stderr)
 
 def manage_updates(args):
     """Manage self-updates"""
-    cmd = ["python", "self_update.py"]
+    import self_update
     
+    argv = []
     if args.list_updates:
-        cmd.append("--list")
+        argv.append("--list")
     elif args.approve:
-        cmd.extend(["--approve", args.approve])
+        argv.extend(["--approve", args.approve])
     elif args.reject:
-        cmd.extend(["--reject", args.reject])
+        argv.extend(["--reject", args.reject])
     elif args.rollback:
-        cmd.extend(["--rollback", args.rollback])
+        argv.extend(["--rollback", args.rollback])
     elif args.cleanup:
-        cmd.extend(["--cleanup", str(args.cleanup)])
+        argv.extend(["--cleanup", str(args.cleanup)])
     
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        print(result.stdout)
-        if result.stderr:
-            print("Errors:", result.stderr, file=sys.stderr)
-    except subprocess.CalledProcessError as e:
+        self_update.main(argv)
+    except Exception as e:
         print(f"Update operation failed: {e}", file=sys.stderr)
 
 def show_status():
@@ -225,6 +290,7 @@ Examples:
   %(prog)s setup                           # Setup Mini-Claude environment
   %(prog)s task "write tests for utils.py" # Run a single task
   %(prog)s daemon --background             # Start daemon in background
+  %(prog)s serve --background              # Keep a warm RPC server for fast CLI calls
   %(prog)s queue --submit "debug error"    # Submit task to queue
   %(prog)s queue --list --status pending   # List pending tasks
   %(prog)s updates --list                  # List pending updates
@@ -232,6 +298,10 @@ Examples:
         """
     )
     
+    parser.add_argument("--socket", default=os.getenv("MINI_CLAUDE_SOCKET", "mini_claude.sock"),
+                        help="RPC server socket to use when a server is running")
+    parser.add_argument("--no-server", action="store_true", help="Never use the RPC server")
+    
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
     
     # Setup command
@@ -243,20 +313,37 @@ Examples:
     task_parser.add_argument("--type", default="general", help="Task type")
     task_parser.add_argument("--file", help="File to process")
     task_parser.add_argument("--code", help="Code to process")
+    task_parser.add_argument("--no-cache", action="store_true", help="Bypass the LLM response cache")
+    task_parser.add_argument("--stream", action="store_true", help="Stream the response as it arrives")
     
     # Daemon command
     daemon_parser = subparsers.add_parser("daemon", help="Start Mini-Claude daemon")
     daemon_parser.add_argument("--background", action="store_true", help="Run in background")
     daemon_parser.add_argument("--config", help="Config file path")
     
+    # Serve command
+    serve_parser = subparsers.add_parser("serve", help="Start the local RPC server")
+    serve_parser.add_argument("--background", action="store_true", help="Run in background")
+    serve_parser.add_argument("--config", help="Config file path")
+    
     # Queue command
     queue_parser = subparsers.add_parser("queue", help="Manage task queue")
     queue_parser.add_argument("--backend", choices=["sqlite", "redis"], default="sqlite")
-    queue_parser.add_argument("--submit", help="Submit a new task")
+    queue_parser.add_argument("--submit", help="Submit a new task, or '-' to read JSONL tasks from stdin")
     queue_parser.add_argument("--type", default="general", help="Task type")
+    queue_parser.add_argument("--priority", type=int, default=5,
+                              help="Task priority, 0 (most urgent) to 9")
+    queue_parser.add_argument("--delay", type=float, help="Run the submitted task after this many seconds")
     queue_parser.add_argument("--list", action="store_true", help="List tasks")
+    queue_parser.add_argument("--count", action="store_true", help="Count tasks without listing them")
     queue_parser.add_argument("--status", help="Filter by status")
     queue_parser.add_argument("--get", help="Get task status by ID")
+    queue_parser.add_argument("--result", help="Print the result of a task by ID")
+    queue_parser.add_argument("--stats", action="store_true", help="Show per-stage timing percentiles")
+    queue_parser.add_argument("--compact", action="store_true",
+                              help="Archive finished tasks older than --retention-days")
+    queue_parser.add_argument("--retention-days", type=float, default=30,
+                              help="Age in days after which --compact archives finished tasks")
     
     # Updates command
     updates_parser = subparsers.add_parser("updates", help="Manage self-updates")
@@ -290,6 +377,8 @@ Examples:
         run_single_task(args)
     elif args.command == "daemon":
         start_daemon(args)
+    elif args.command == "serve":
+        start_server(args)
     elif args.command == "queue":
         manage_queue(args)
     elif args.command == "updates":
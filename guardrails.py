@@ -8,10 +8,18 @@ import os
 import re
 import ast
 import json
+import hashlib
 import logging
+import mmap
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Set
-from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Set, Tuple, Iterable, Iterator
+from dataclasses import dataclass, asdict
 import subprocess
 import tempfile
 
@@ -23,6 +31,230 @@ class SecurityViolation:
     description: str
     details: Dict[str, Any]
 
+# Files at least this large are read through mmap
+MMAP_THRESHOLD = 1024 * 1024
+
+# Language rules applied to files by validate_many; anything else gets the
+# generic shell-command rules
+LANGUAGE_BY_EXTENSION = {
+    ".py": "python",
+    ".js": "javascript", ".jsx": "javascript", ".mjs": "javascript",
+    ".ts": "typescript", ".tsx": "typescript",
+}
+
+# "audit" collects every finding; "block" stops at the first critical one,
+# and skips checks that cannot change an allow/deny decision
+MODES = ("audit", "block")
+
+# Bump when analysis logic changes in a way the rule lists don't show, so
+# persisted verdicts from older code are dropped
+RULESET_VERSION = 3
+
+# (pattern, severity, category, description prefix)
+Rule = Tuple[str, str, str, str]
+
+def fold_case(text: str) -> str:
+    """Lowercase text, keeping positions, so that lowercase ASCII patterns
+    match it wherever re.IGNORECASE would match the original"""
+    if text.isascii():
+        return text.lower()
+    # İ ı ſ K are the only non-ASCII characters IGNORECASE equates with ASCII
+    # letters, and İ is the only character whose lower() is two long
+    return text.replace("\u0130", "i").lower().replace("\u0131", "i").replace("\u017f", "s")
+
+def _lower_pattern(pattern: str) -> str:
+    """Lowercase a regex, leaving escapes such as \\S alone"""
+    parts = re.split(r"(\\.)", pattern)
+    return "".join(part if part.startswith("\\") else part.lower() for part in parts)
+
+class RuleSet:
+    """Regex rules compiled into one alternation and scanned in one pass
+    
+    The combined pattern finds each position where some rule matches, and
+    only there are the rules tried one by one. The alternatives are left
+    uncaptured so the engine can still skip ahead by first character.
+    Violations are the same, in the same order (by rule, then
+    position), as running re.finditer once per rule.
+    
+    IGNORECASE defeats the regex engine's first-character skipping, so for
+    ASCII rules the combined pattern is compiled lowercase and case-sensitive
+    and runs over fold_case(code); matches are still confirmed against code.
+    """
+    
+    def __init__(self, rules: Tuple[Rule, ...], flags: int = re.IGNORECASE | re.MULTILINE):
+        self.rules = rules
+        self.compiled = [re.compile(rule[0], flags) for rule in rules]
+        self.fold = bool(flags & re.IGNORECASE) and all(rule[0].isascii() for rule in rules)
+        if self.fold:
+            flags &= ~re.IGNORECASE
+        self.combined = re.compile("|".join(
+            f"(?:{_lower_pattern(rule[0]) if self.fold else rule[0]})" for rule in rules
+        ), flags)
+    
+    def scan(self, code: str, folded: Optional[str] = None,
+             stop_severity: Optional[str] = None) -> List[SecurityViolation]:
+        """Find every rule match in code, or stop at the first of stop_severity
+        
+        folded may pass in fold_case(code) when the caller already has it.
+        """
+        found = []
+        # finditer never overlaps matches of one rule, but rules overlap each other
+        resume = [0] * len(self.rules)
+        text = (folded if folded is not None else fold_case(code)) if self.fold else code
+        match = self.combined.search(text)
+        while match:
+            position = match.start()
+            for i, rule_regex in enumerate(self.compiled):
+                if position >= resume[i]:
+                    rule_match = rule_regex.match(code, position)
+                    if rule_match:
+                        found.append((i, position, rule_match.group()))
+                        resume[i] = rule_match.end()
+                        if self.rules[i][1] == stop_severity:
+                            return self._violations(sorted(found))
+            match = self.combined.search(text, position + 1)
+        
+        return self._violations(sorted(found))
+    
+    def scan_each(self, code: str) -> List[SecurityViolation]:
+        """Reference scan making one re.finditer pass per rule"""
+        found = []
+        for i, rule_regex in enumerate(self.compiled):
+            for rule_match in rule_regex.finditer(code):
+                found.append((i, rule_match.start(), rule_match.group()))
+        return self._violations(found)
+    
+    def _violations(self, found: List[Tuple[int, int, str]]) -> List[SecurityViolation]:
+        violations = []
+        for i, position, text in found:
+            pattern, severity, category, description = self.rules[i]
+            violations.append(SecurityViolation(
+                severity=severity,
+                category=category,
+                description=f"{description}: {text}",
+                details={"pattern": pattern, "match": text, "position": position}
+            ))
+        return violations
+
+@lru_cache(maxsize=None)
+def compile_rules(rules: Tuple[Rule, ...]) -> RuleSet:
+    """Compile a rule tuple once per process"""
+    return RuleSet(rules)
+
+class ASTAnalyzer(ast.NodeVisitor):
+    """Checks a parsed Python module in one pass over its nodes
+    
+    Handlers are looked up by node type in a dispatch table, and the tree
+    is walked with an explicit stack so deeply nested code cannot exhaust
+    the recursion limit. Calls are resolved after the walk, once every
+    import is known, so calls through aliases (import os as o;
+    o.system(...)) and from-imports (from os import system; system(...))
+    resolve to the real name wherever the import sits.
+    """
+    
+    DANGEROUS_FUNCTIONS = {"eval", "exec", "compile"}
+    SYSTEM_COMMANDS = {"os.system"}
+    DANGEROUS_MODULES = {"os", "subprocess", "shutil"}
+    # Nodes that can have no call or import below them are never pushed
+    LEAF_TYPES = (ast.Name, ast.Constant, ast.expr_context, ast.operator,
+                  ast.unaryop, ast.cmpop, ast.boolop)
+    
+    def __init__(self, stop_severity: Optional[str] = None):
+        self.stop_severity = stop_severity
+        self.violations: List[SecurityViolation] = []
+        # Local name -> dotted name it was imported as
+        self.aliases: Dict[str, str] = {}
+        self.calls: List[ast.Call] = []
+        self.dispatch = {
+            ast.Call: self.visit_Call,
+            ast.Import: self.visit_Import,
+            ast.ImportFrom: self.visit_ImportFrom,
+        }
+    
+    def visit(self, node: ast.AST) -> List[SecurityViolation]:
+        """Check node and everything below it"""
+        dispatch, leaf_types = self.dispatch, self.LEAF_TYPES
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            handler = dispatch.get(type(node))
+            if handler:
+                handler(node)
+            for field in node._fields:
+                value = getattr(node, field, None)
+                if isinstance(value, list):
+                    for item in value:
+                        if isinstance(item, ast.AST) and not isinstance(item, leaf_types):
+                            stack.append(item)
+                elif isinstance(value, ast.AST) and not isinstance(value, leaf_types):
+                    stack.append(value)
+        
+        for call in self.calls:
+            if self.stopped():
+                break
+            self._check_call(call)
+        self.violations.sort(key=lambda violation: violation.details["line"])
+        return self.violations
+    
+    def stopped(self) -> bool:
+        return bool(self.violations) and self.violations[-1].severity == self.stop_severity
+    
+    def _report(self, severity: str, category: str, description: str, details: Dict[str, Any]):
+        self.violations.append(SecurityViolation(
+            severity=severity, category=category, description=description, details=details
+        ))
+    
+    def resolve(self, node: ast.AST) -> Optional[str]:
+        """Dotted name of a Name/Attribute chain, with import aliases applied"""
+        parts = []
+        while isinstance(node, ast.Attribute):
+            parts.append(node.attr)
+            node = node.value
+        if not isinstance(node, ast.Name):
+            return None
+        parts.append(self.aliases.get(node.id, node.id))
+        return ".".join(reversed(parts))
+    
+    def visit_Call(self, node: ast.Call):
+        self.calls.append(node)
+    
+    def _check_call(self, node: ast.Call):
+        name = self.resolve(node.func)
+        if name is None:
+            return
+        if name.startswith("builtins."):
+            name = name[len("builtins."):]
+        
+        if name in self.DANGEROUS_FUNCTIONS:
+            self._report("critical", "code_injection", f"Dangerous function call: {name}",
+                         {"function": name, "line": node.lineno})
+        elif name in self.SYSTEM_COMMANDS:
+            self._report("critical", "system_command", "Direct system command execution",
+                         {"method": name, "line": node.lineno})
+    
+    def visit_Import(self, node: ast.Import):
+        for alias in node.names:
+            if alias.asname:
+                self.aliases[alias.asname] = alias.name
+            else:
+                # import os.path binds os
+                top = alias.name.split(".")[0]
+                self.aliases[top] = top
+            self._check_module(alias.name, node)
+    
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        if node.level or not node.module:
+            return
+        for alias in node.names:
+            if alias.name != "*":
+                self.aliases[alias.asname or alias.name] = f"{node.module}.{alias.name}"
+        self._check_module(node.module, node)
+    
+    def _check_module(self, module: str, node: ast.AST):
+        if module.split(".")[0] in self.DANGEROUS_MODULES:
+            self._report("high", "dangerous_import", f"Import of potentially dangerous module: {module}",
+                         {"module": module, "line": node.lineno})
+
 class CodeAnalyzer:
     """Analyzes code for security vulnerabilities"""
     
@@ -85,49 +317,88 @@ class CodeAnalyzer:
         r'__getattribute__',
     ]
     
-    def analyze_code(self, code: str, language: str = "python") -> List[SecurityViolation]:
-        """Analyze code for security issues"""
+    JS_DANGEROUS_PATTERNS = [
+        r'eval\s*\(',
+        r'Function\s*\(',
+        r'setTimeout\s*\(\s*["\'][^"\']*["\']',
+        r'setInterval\s*\(\s*["\'][^"\']*["\']',
+        r'document\.write\s*\(',
+        r'innerHTML\s*=',
+        r'outerHTML\s*=',
+        r'require\s*\(\s*["\']child_process["\']',
+        r'require\s*\(\s*["\']fs["\']',
+        r'require\s*\(\s*["\']path["\']',
+    ]
+    
+    SHELL_PATTERNS = [
+        r'rm\s+-rf',
+        r'sudo\s+',
+        r'chmod\s+777',
+        r'> /dev/null',
+        r'2>&1',
+        r'\| sh',
+        r'\| bash',
+    ]
+    
+    def __init__(self):
+        self.python_rules = compile_rules(
+            tuple((p, "critical", "dangerous_operation", "Critical security pattern detected")
+                  for p in self.CRITICAL_PATTERNS) +
+            tuple((p, "high", "risky_operation", "High-risk pattern detected")
+                  for p in self.HIGH_RISK_PATTERNS)
+        )
+        self.js_rules = compile_rules(tuple(
+            (p, "high", "dangerous_operation", "Dangerous JavaScript pattern")
+            for p in self.JS_DANGEROUS_PATTERNS
+        ))
+        self.shell_rules = compile_rules(tuple(
+            (p, "high", "shell_command", "Potentially dangerous shell command")
+            for p in self.SHELL_PATTERNS
+        ))
+    
+    # Every AST finding needs one of these names in the source
+    AST_HINTS = ("eval", "exec", "compile", "system", "import")
+    
+    def analyze_code(self, code: str, language: str = "python", mode: str = "audit",
+                     tree: Optional[ast.AST] = None) -> List[SecurityViolation]:
+        """Analyze code for security issues (mode is one of MODES)
+        
+        Python callers that already parsed code can pass the tree.
+        """
         violations = []
         
         if language.lower() == "python":
-            violations.extend(self._analyze_python_code(code))
+            violations.extend(self._analyze_python_code(code, mode, tree))
         elif language.lower() in ["javascript", "js", "typescript", "ts"]:
-            violations.extend(self._analyze_javascript_code(code))
+            violations.extend(self._analyze_javascript_code(code, mode))
         else:
-            violations.extend(self._analyze_generic_code(code))
+            violations.extend(self._analyze_generic_code(code, mode))
         
         return violations
     
-    def _analyze_python_code(self, code: str) -> List[SecurityViolation]:
-        """Analyze Python code specifically"""
-        violations = []
+    def _analyze_python_code(self, code: str, mode: str = "audit",
+                             tree: Optional[ast.AST] = None) -> List[SecurityViolation]:
+        """Analyze Python code specifically
         
-        # Pattern-based analysis
-        for pattern in self.CRITICAL_PATTERNS:
-            matches = re.finditer(pattern, code, re.IGNORECASE | re.MULTILINE)
-            for match in matches:
-                violations.append(SecurityViolation(
-                    severity="critical",
-                    category="dangerous_operation",
-                    description=f"Critical security pattern detected: {match.group()}",
-                    details={"pattern": pattern, "match": match.group(), "position": match.start()}
-                ))
-        
-        for pattern in self.HIGH_RISK_PATTERNS:
-            matches = re.finditer(pattern, code, re.IGNORECASE | re.MULTILINE)
-            for match in matches:
-                violations.append(SecurityViolation(
-                    severity="high",
-                    category="risky_operation",
-                    description=f"High-risk pattern detected: {match.group()}",
-                    details={"pattern": pattern, "match": match.group(), "position": match.start()}
-                ))
+        Tiers get dearer: one regex pass over the code, then the AST. In
+        block mode a critical match skips the AST, and so does code without
+        any AST_HINTS, since a syntax error alone never blocks.
+        """
+        # Pattern-based analysis, critical and high-risk rules in one pass
+        blocking = mode == "block"
+        violations = self.python_rules.scan(code, stop_severity="critical" if blocking else None)
+        if blocking and any(v.severity == "critical" for v in violations):
+            return violations
+        # Identifiers are NFKC-normalized, so only ASCII source can be ruled out by name
+        if blocking and code.isascii() and not any(hint in code for hint in self.AST_HINTS):
+            return violations
         
         # AST-based analysis for Python
         try:
-            tree = ast.parse(code)
-            violations.extend(self._analyze_ast(tree))
-        except SyntaxError:
+            if tree is None:
+                tree = ast.parse(code)
+            violations.extend(self._analyze_ast(tree, mode))
+        except (SyntaxError, ValueError, RecursionError):
             # If code doesn't parse, that's suspicious
             violations.append(SecurityViolation(
                 severity="medium",
@@ -138,108 +409,37 @@ class CodeAnalyzer:
         
         return violations
     
-    def _analyze_ast(self, tree: ast.AST) -> List[SecurityViolation]:
+    def _analyze_ast(self, tree: ast.AST, mode: str = "audit") -> List[SecurityViolation]:
         """Analyze Python AST for dangerous operations"""
-        violations = []
-        
-        for node in ast.walk(tree):
-            # Check for dangerous function calls
-            if isinstance(node, ast.Call):
-                if isinstance(node.func, ast.Name):
-                    if node.func.id in ['eval', 'exec', 'compile']:
-                        violations.append(SecurityViolation(
-                            severity="critical",
-                            category="code_injection",
-                            description=f"Dangerous function call: {node.func.id}",
-                            details={"function": node.func.id, "line": node.lineno}
-                        ))
-                
-                elif isinstance(node.func, ast.Attribute):
-                    if node.func.attr in ['system'] and isinstance(node.func.value, ast.Name):
-                        if node.func.value.id == 'os':
-                            violations.append(SecurityViolation(
-                                severity="critical",
-                                category="system_command",
-                                description="Direct system command execution",
-                                details={"method": "os.system", "line": node.lineno}
-                            ))
-            
-            # Check for dangerous imports
-            elif isinstance(node, ast.Import):
-                for alias in node.names:
-                    if alias.name in ['os', 'subprocess', 'shutil']:
-                        violations.append(SecurityViolation(
-                            severity="high",
-                            category="dangerous_import",
-                            description=f"Import of potentially dangerous module: {alias.name}",
-                            details={"module": alias.name, "line": node.lineno}
-                        ))
-        
-        return violations
+        return ASTAnalyzer("critical" if mode == "block" else None).visit(tree)
     
-    def _analyze_javascript_code(self, code: str) -> List[SecurityViolation]:
+    def _analyze_javascript_code(self, code: str, mode: str = "audit") -> List[SecurityViolation]:
         """Analyze JavaScript/TypeScript code"""
-        violations = []
-        
-        js_dangerous_patterns = [
-            r'eval\s*\(',
-            r'Function\s*\(',
-            r'setTimeout\s*\(\s*["\'][^"\']*["\']',
-            r'setInterval\s*\(\s*["\'][^"\']*["\']',
-            r'document\.write\s*\(',
-            r'innerHTML\s*=',
-            r'outerHTML\s*=',
-            r'require\s*\(\s*["\']child_process["\']',
-            r'require\s*\(\s*["\']fs["\']',
-            r'require\s*\(\s*["\']path["\']',
-        ]
-        
-        for pattern in js_dangerous_patterns:
-            matches = re.finditer(pattern, code, re.IGNORECASE | re.MULTILINE)
-            for match in matches:
-                violations.append(SecurityViolation(
-                    severity="high",
-                    category="dangerous_operation",
-                    description=f"Dangerous JavaScript pattern: {match.group()}",
-                    details={"pattern": pattern, "match": match.group(), "position": match.start()}
-                ))
-        
-        return violations
+        return self.js_rules.scan(code, stop_severity="critical" if mode == "block" else None)
     
-    def _analyze_generic_code(self, code: str) -> List[SecurityViolation]:
+    def _analyze_generic_code(self, code: str, mode: str = "audit") -> List[SecurityViolation]:
         """Generic code analysis for other languages"""
-        violations = []
-        
         # Look for shell commands
-        shell_patterns = [
-            r'rm\s+-rf',
-            r'sudo\s+',
-            r'chmod\s+777',
-            r'> /dev/null',
-            r'2>&1',
-            r'\| sh',
-            r'\| bash',
-        ]
-        
-        for pattern in shell_patterns:
-            matches = re.finditer(pattern, code, re.IGNORECASE | re.MULTILINE)
-            for match in matches:
-                violations.append(SecurityViolation(
-                    severity="high",
-                    category="shell_command",
-                    description=f"Potentially dangerous shell command: {match.group()}",
-                    details={"pattern": pattern, "match": match.group(), "position": match.start()}
-                ))
-        
-        return violations
+        return self.shell_rules.scan(code, stop_severity="critical" if mode == "block" else None)
 
 class FileSystemGuard:
     """Guards against dangerous file system operations"""
     
+    SUSPICIOUS_PATTERNS = [
+        r'-----BEGIN [A-Z]+ KEY-----',  # Potential private keys
+        r'password\s*=\s*["\'][^"\']+["\']',  # Hardcoded passwords
+        r'secret\s*=\s*["\'][^"\']+["\']',  # Hardcoded secrets
+        r'token\s*=\s*["\'][^"\']+["\']',  # Hardcoded tokens
+    ]
+    
     def __init__(self, config: Dict[str, Any]):
         self.max_file_size = config.get("max_file_size", 10 * 1024 * 1024)  # 10MB
         self.allowed_extensions = set(config.get("allowed_file_extensions", []))
         self.forbidden_dirs = set(config.get("forbidden_directories", []))
+        self.suspicious_rules = compile_rules(tuple(
+            (p, "high", "sensitive_data", "Potential sensitive data detected")
+            for p in self.SUSPICIOUS_PATTERNS
+        ))
     
     def validate_file_path(self, file_path: str) -> List[SecurityViolation]:
         """Validate file path for security"""
@@ -301,16 +501,12 @@ class FileSystemGuard:
                 details={"content_length": len(content)}
             ))
         
-        # Check for suspicious patterns
-        suspicious_patterns = [
-            r'-----BEGIN [A-Z]+ KEY-----',  # Potential private keys
-            r'password\s*=\s*["\'][^"\']+["\']',  # Hardcoded passwords
-            r'secret\s*=\s*["\'][^"\']+["\']',  # Hardcoded secrets
-            r'token\s*=\s*["\'][^"\']+["\']',  # Hardcoded tokens
-        ]
-        
-        for pattern in suspicious_patterns:
-            if re.search(pattern, content, re.IGNORECASE):
+        # Check for suspicious patterns, reporting each pattern once
+        reported = set()
+        for match in self.suspicious_rules.scan(content):
+            pattern = match.details["pattern"]
+            if pattern not in reported:
+                reported.add(pattern)
                 violations.append(SecurityViolation(
                     severity="high",
                     category="sensitive_data",
@@ -371,14 +567,170 @@ class ExecutionSandbox:
         
         return violations
 
+def ruleset_fingerprint(security_config: Dict[str, Any]) -> str:
+    """Hash the rule lists, AST name sets and security config that verdicts depend on"""
+    payload = json.dumps([
+        RULESET_VERSION,
+        CodeAnalyzer.CRITICAL_PATTERNS,
+        CodeAnalyzer.HIGH_RISK_PATTERNS,
+        CodeAnalyzer.JS_DANGEROUS_PATTERNS,
+        CodeAnalyzer.SHELL_PATTERNS,
+        FileSystemGuard.SUSPICIOUS_PATTERNS,
+        sorted(ASTAnalyzer.DANGEROUS_FUNCTIONS),
+        sorted(ASTAnalyzer.SYSTEM_COMMANDS),
+        sorted(ASTAnalyzer.DANGEROUS_MODULES),
+        sorted(CodeAnalyzer.AST_HINTS),
+        security_config
+    ], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class VerdictCache:
+    """Bounded LRU of validation results keyed by content hash
+    
+    Keys hash the rule-set fingerprint, the kind of check and the content,
+    so changing a rule or the security config simply stops old entries
+    from matching. With db_path set, verdicts are also written to SQLite
+    and survive restarts; entries of other fingerprints are dropped there
+    when the fingerprint is first seen. The database runs in WAL mode with
+    a busy timeout, so validate_many workers can share it.
+    """
+    
+    def __init__(self, max_entries: int = 10000, db_path: Optional[str] = None,
+                 busy_timeout: float = 30.0):
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self.entries: "OrderedDict[str, List[SecurityViolation]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self._pruned: Set[str] = set()
+        if db_path:
+            self._init_database()
+    
+    def _connect(self) -> sqlite3.Connection:
+        # Opened per call, not per thread: the cache outlives forks into
+        # validate_many workers, and it is only touched on memory misses
+        return sqlite3.connect(self.db_path, timeout=self.busy_timeout)
+    
+    def _init_database(self):
+        """Initialize the verdict database"""
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS verdicts (
+                    key TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    violations TEXT NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_verdicts_last_access
+                ON verdicts(last_access)
+            """)
+    
+    @staticmethod
+    def make_key(fingerprint: str, kind: str, content: str) -> str:
+        """Hash fingerprint, kind of check and content into a cache key"""
+        digest = hashlib.sha256(f"{fingerprint}\0{kind}\0".encode())
+        digest.update(content.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+    
+    def get(self, key: str) -> Optional[List[SecurityViolation]]:
+        """Return cached violations, or None on miss"""
+        with self.lock:
+            violations = self.entries.get(key)
+            if violations is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return list(violations)
+        
+        if self.db_path:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute("SELECT violations FROM verdicts WHERE key = ?", (key,)).fetchone()
+                if row:
+                    conn.execute("UPDATE verdicts SET last_access = ? WHERE key = ?", (time.time(), key))
+                    violations = [SecurityViolation(**v) for v in json.loads(row[0])]
+                    self._remember(key, violations)
+                    with self.lock:
+                        self.hits += 1
+                    return list(violations)
+        
+        with self.lock:
+            self.misses += 1
+        return None
+    
+    def put(self, key: str, fingerprint: str, violations: List[SecurityViolation],
+            persist: bool = True):
+        """Store violations, evicting the least recently used entries
+        
+        persist=False only updates memory, for verdicts another process
+        sharing db_path already wrote.
+        """
+        self._remember(key, list(violations))
+        if not self.db_path or not persist:
+            return
+        
+        with closing(self._connect()) as conn, conn:
+            if fingerprint not in self._pruned:
+                # Rules or config changed since these were stored
+                conn.execute("DELETE FROM verdicts WHERE fingerprint != ?", (fingerprint,))
+                self._pruned.add(fingerprint)
+            conn.execute("""
+                INSERT OR REPLACE INTO verdicts (key, fingerprint, violations, last_access)
+                VALUES (?, ?, ?, ?)
+            """, (key, fingerprint, json.dumps([asdict(v) for v in violations]), time.time()))
+            conn.execute("""
+                DELETE FROM verdicts WHERE key IN (
+                    SELECT key FROM verdicts ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+    
+    def snapshot(self) -> List[Tuple[str, List[SecurityViolation]]]:
+        """In-memory entries, least recently used first"""
+        with self.lock:
+            return list(self.entries.items())
+    
+    def preload(self, entries: Iterable[Tuple[str, List[SecurityViolation]]]):
+        """Add entries, e.g. a snapshot() taken in another process"""
+        for key, violations in entries:
+            self._remember(key, violations)
+    
+    def _remember(self, key: str, violations: List[SecurityViolation]):
+        with self.lock:
+            self.entries[key] = violations
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss statistics"""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self.entries)
+            }
+
+@lru_cache(maxsize=None)
+def shared_verdict_cache(max_entries: int = 10000, db_path: Optional[str] = None) -> VerdictCache:
+    """Process-wide cache, so short-lived guardrail instances still share verdicts"""
+    return VerdictCache(max_entries, db_path)
+
 class ComprehensiveGuardrails:
     """Main security guardrails system"""
     
-    def __init__(self, config_path: str = "config.json"):
+    def __init__(self, config_path: str = "config.json", cache: Optional[VerdictCache] = None):
+        self.config_path = config_path
         self.config = self._load_config(config_path)
         self.code_analyzer = CodeAnalyzer()
         self.fs_guard = FileSystemGuard(self.config.get("security", {}))
         self.sandbox = ExecutionSandbox(self.config.get("security", {}))
+        self.fingerprint = ruleset_fingerprint(self.config.get("security", {}))
+        self.cache = cache or self._create_cache(self.config.get("guardrail_cache", {}))
         
         # Setup logging
         self.logger = logging.getLogger(__name__)
@@ -390,9 +742,32 @@ class ComprehensiveGuardrails:
                 return json.load(f)
         return {}
     
+    def _create_cache(self, cache_config: Dict[str, Any]) -> Optional[VerdictCache]:
+        """Get the shared verdict cache if enabled"""
+        if not cache_config.get("enabled", True):
+            return None
+        return shared_verdict_cache(cache_config.get("max_entries", 10000), cache_config.get("path"))
+    
+    def _cached(self, kind: str, content: str, validate) -> List[SecurityViolation]:
+        """Run validate() unless content was already checked against these rules"""
+        return self._cached_verdict(kind, content, validate)[0]
+    
+    def _cached_verdict(self, kind: str, content: str,
+                        validate) -> Tuple[List[SecurityViolation], Optional[str]]:
+        """Like _cached, also returning the cache key if the verdict is new"""
+        if not self.cache:
+            return validate(), None
+        key = VerdictCache.make_key(self.fingerprint, kind, content)
+        violations = self.cache.get(key)
+        if violations is not None:
+            return violations, None
+        violations = validate()
+        self.cache.put(key, self.fingerprint, violations)
+        return violations, key
+    
     def validate_task(self, task_description: str, task_type: str, 
-                     parameters: Dict[str, Any]) -> List[SecurityViolation]:
-        """Comprehensive task validation"""
+                     parameters: Dict[str, Any], mode: str = "audit") -> List[SecurityViolation]:
+        """Comprehensive task validation (mode is one of MODES)"""
         violations = []
         
         # Validate task type
@@ -415,24 +790,111 @@ class ComprehensiveGuardrails:
                 if isinstance(value, str):
                     violations.extend(self.fs_guard.validate_file_path(value))
         
+        if mode == "block" and any(v.severity == "critical" for v in violations):
+            return violations
+        
         # Validate code content
         if "code" in parameters:
             language = parameters.get("language", "python")
-            violations.extend(self.code_analyzer.analyze_code(parameters["code"], language))
+            violations.extend(self._cached(
+                f"{mode}:code:{language}", parameters["code"],
+                lambda: self.code_analyzer.analyze_code(parameters["code"], language, mode)
+            ))
         
         return violations
     
-    def validate_generated_content(self, content: str, content_type: str = "code") -> List[SecurityViolation]:
-        """Validate generated content"""
+    def validate_generated_content(self, content: str, content_type: str = "code",
+                                   mode: str = "audit") -> List[SecurityViolation]:
+        """Validate generated content (mode is one of MODES)"""
+        return self._cached(f"{mode}:generated:{content_type}", content,
+                            lambda: self._validate_generated_content(content, content_type, mode))
+    
+    def _validate_generated_content(self, content: str, content_type: str,
+                                    mode: str) -> List[SecurityViolation]:
         violations = []
         
         if content_type == "code":
-            violations.extend(self.code_analyzer.analyze_code(content))
+            violations.extend(self.code_analyzer.analyze_code(content, mode=mode))
+            if mode == "block" and any(v.severity == "critical" for v in violations):
+                return violations
         
         violations.extend(self.fs_guard.validate_file_content(content))
         
         return violations
     
+    def validate_file(self, file_path: str, mode: str = "audit") -> List[SecurityViolation]:
+        """Validate a file's path and, unless it is too large, its content"""
+        path_violations, content_violations, _ = self._check_file(file_path, mode)
+        return path_violations + content_violations
+    
+    def _check_file(self, file_path: str, mode: str) -> Tuple[
+            List[SecurityViolation], List[SecurityViolation], Optional[str]]:
+        """Path violations, content violations and, for a fresh verdict, its cache key"""
+        violations = self.fs_guard.validate_file_path(file_path)
+        if any(v.category == "file_too_large" for v in violations):
+            return violations, [], None
+        if mode == "block" and any(v.severity == "critical" for v in violations):
+            return violations, [], None
+        
+        try:
+            content = read_source(file_path)
+        except OSError as e:
+            violations.append(SecurityViolation(
+                severity="medium",
+                category="unreadable_file",
+                description=f"Could not read file: {e}",
+                details={"path": file_path}
+            ))
+            return violations, [], None
+        
+        language = LANGUAGE_BY_EXTENSION.get(Path(file_path).suffix.lower(), "generic")
+        content_violations, key = self._cached_verdict(
+            f"{mode}:file:{language}", content,
+            lambda: self._validate_file_content(content, language, mode)
+        )
+        return violations, content_violations, key
+    
+    def _validate_file_content(self, content: str, language: str, mode: str) -> List[SecurityViolation]:
+        violations = self.code_analyzer.analyze_code(content, language, mode)
+        if mode == "block" and any(v.severity == "critical" for v in violations):
+            return violations
+        violations.extend(self.fs_guard.validate_file_content(content))
+        return violations
+    
+    def validate_many(self, files: Iterable[str], workers: Optional[int] = None,
+                      mode: str = "audit") -> Iterator[Tuple[str, List[SecurityViolation]]]:
+        """Validate files across a process pool, yielding (path, violations) as each finishes
+        
+        Regex and AST checks hold the GIL, so files are spread over worker
+        processes (os.cpu_count() by default); results arrive in completion
+        order. One worker, or a single file, runs in this process.
+        
+        Workers start from a snapshot of this process's verdict cache and
+        send new verdicts back, so unchanged files hit the cache on the next
+        scan even without a guardrail_cache.path.
+        """
+        files = list(files)
+        workers = min(workers or os.cpu_count() or 1, len(files))
+        if workers <= 1:
+            for file_path in files:
+                yield file_path, self.validate_file(file_path, mode)
+            return
+        
+        from multiprocessing import Pool
+        
+        snapshot = self.cache.snapshot() if self.cache else []
+        with Pool(workers, initializer=_init_validate_worker,
+                  initargs=(self.config_path, snapshot)) as pool:
+            # Small chunks keep results streaming while still batching round trips
+            chunksize = max(1, min(16, len(files) // (workers * 8)))
+            jobs = [(f, mode) for f in files]
+            for file_path, path_violations, content_violations, key in pool.imap_unordered(
+                    _validate_worker, jobs, chunksize):
+                if key and self.cache:
+                    # The worker already wrote it to the shared database, if any
+                    self.cache.put(key, self.fingerprint, content_violations, persist=False)
+                yield file_path, path_violations + content_violations
+    
     def validate_command_execution(self, command: str) -> List[SecurityViolation]:
         """Validate command before execution"""
         return self.sandbox.validate_command(command)
@@ -478,8 +940,25 @@ class ComprehensiveGuardrails:
 class SecurityGuardrails:
     """Enhanced security guardrails for Mini-Claude (maintains backward compatibility)"""
     
-    def __init__(self):
-        self.comprehensive = ComprehensiveGuardrails()
+    _shared: Optional[ComprehensiveGuardrails] = None
+    _shared_key: Optional[Tuple[str, Optional[float]]] = None
+    _shared_lock = threading.Lock()
+    
+    def __init__(self, config_path: str = "config.json"):
+        self.comprehensive = self._comprehensive(config_path)
+    
+    @classmethod
+    def _comprehensive(cls, config_path: str) -> ComprehensiveGuardrails:
+        """Reuse one ComprehensiveGuardrails until config_path changes"""
+        try:
+            mtime = os.stat(config_path).st_mtime
+        except OSError:
+            mtime = None
+        with cls._shared_lock:
+            if cls._shared is None or cls._shared_key != (config_path, mtime):
+                cls._shared = ComprehensiveGuardrails(config_path)
+                cls._shared_key = (config_path, mtime)
+            return cls._shared
     
     @classmethod
     def validate_task(cls, task) -> bool:
@@ -488,7 +967,8 @@ class SecurityGuardrails:
         violations = guardrails.comprehensive.validate_task(
             task.description, 
             task.task_type, 
-            task.parameters
+            task.parameters,
+            mode="block"
         )
         
         # Return False if any critical or high severity violations
@@ -498,11 +978,111 @@ class SecurityGuardrails:
     def validate_code(cls, code: str) -> bool:
         """Backward compatible code validation"""
         guardrails = cls()
-        violations = guardrails.comprehensive.validate_generated_content(code, "code")
+        violations = guardrails.comprehensive.validate_generated_content(code, "code", mode="block")
         
         # Return False if any critical violations
         return not any(v.severity == "critical" for v in violations)
 
-<function_calls>
-<invoke name="TodoWrite">
-<parameter name="todos">[{"id": "1", "content": "Design Mini-Claude architecture and core components", "status": "completed", "priority": "high"}, {"id": "2", "content": "Create core agent framework (mini_claude.py)", "status": "completed", "priority": "high"}, {"id": "3", "content": "Build task queue system (task_queue.py)", "status": "completed", "priority": "high"}, {"id": "4", "content": "Create prompt templates directory with reusable prompts", "status": "completed", "priority": "medium"}, {"id": "5", "content": "Implement self-update mechanism (self_update.py)", "status": "completed", "priority": "medium"}, {"id": "6", "content": "Add guardrails and security measures", "status": "completed", "priority": "high"}, {"id": "7", "content": "Create CLI interface and configuration", "status": "in_progress", "priority": "medium"}, {"id": "8", "content": "Generate requirements.txt and setup files", "status": "pending", "priority": "low"}, {"id": "9", "content": "Create comprehensive README.md documentation", "status": "pending", "priority": "medium"}, {"id": "10", "content": "Generate architecture diagram", "status": "pending", "priority": "low"}]
\ No newline at end of file
+def read_source(file_path: str) -> str:
+    """Read a text file, mapping large ones instead of buffering them"""
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < MMAP_THRESHOLD:
+            return f.read().decode('utf-8', errors='replace')
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return str(mapped, 'utf-8', errors='replace')
+
+_worker_guardrails: Optional[ComprehensiveGuardrails] = None
+
+def _init_validate_worker(config_path: str, snapshot: List[Tuple[str, List[SecurityViolation]]]):
+    global _worker_guardrails
+    _worker_guardrails = ComprehensiveGuardrails(config_path)
+    if _worker_guardrails.cache:
+        _worker_guardrails.cache.preload(snapshot)
+
+def _validate_worker(job: Tuple[str, str]) -> Tuple[
+        str, List[SecurityViolation], List[SecurityViolation], Optional[str]]:
+    file_path, mode = job
+    return (file_path, *_worker_guardrails._check_file(file_path, mode))
+
+def expand_paths(paths: Iterable[str], suffixes: Optional[Set[str]] = None) -> Iterator[str]:
+    """Yield files given directly, and files under directories whose suffix is in suffixes"""
+    for path in paths:
+        if Path(path).is_file():
+            yield path
+            continue
+        for file in sorted(Path(path).rglob("*")):
+            if file.is_file() and (not suffixes or file.suffix in suffixes):
+                yield str(file)
+
+def benchmark_rules(paths: List[str], repeat: int = 3) -> List[Dict[str, Any]]:
+    """Compare single-pass and per-rule scan throughput over the files in paths"""
+    corpus = [read_source(file) for file in expand_paths(paths, {".py"})]
+    megabytes = sum(len(code) for code in corpus) / 1e6
+    
+    analyzer = CodeAnalyzer()
+    results = []
+    for name, rules in [("python", analyzer.python_rules), ("javascript", analyzer.js_rules),
+                        ("shell", analyzer.shell_rules)]:
+        timings = {}
+        outputs = {}
+        for method in ("scan_each", "scan"):
+            scan = getattr(rules, method)
+            best = float("inf")
+            for _ in range(repeat):
+                started = time.perf_counter()
+                outputs[method] = [scan(code) for code in corpus]
+                best = min(best, time.perf_counter() - started)
+            timings[method] = best
+        results.append({
+            "rules": name,
+            "files": len(corpus),
+            "megabytes": round(megabytes, 2),
+            "violations": sum(len(found) for found in outputs["scan"]),
+            "identical": outputs["scan"] == outputs["scan_each"],
+            "per_rule_mb_s": round(megabytes / timings["scan_each"], 2) if timings["scan_each"] else 0.0,
+            "single_pass_mb_s": round(megabytes / timings["scan"], 2) if timings["scan"] else 0.0
+        })
+    return results
+
+def main(argv: Optional[List[str]] = None):
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Mini-Claude security guardrails")
+    parser.add_argument("--benchmark", nargs="+", metavar="PATH",
+                        help="Benchmark rule scanning over these files or directories")
+    parser.add_argument("--repeat", type=int, default=3, help="Benchmark runs, the best is kept")
+    parser.add_argument("--scan", nargs="+", metavar="PATH",
+                        help="Validate these files, and files with allowed extensions under these directories")
+    parser.add_argument("--workers", type=int, help="Worker processes for --scan (default: CPU count)")
+    parser.add_argument("--block", action="store_true",
+                        help="Stop each file's scan at its first critical finding")
+    parser.add_argument("--config", default="config.json", help="Config file path")
+    
+    args = parser.parse_args(argv)
+    
+    if args.scan:
+        guardrails = ComprehensiveGuardrails(args.config)
+        files = expand_paths(args.scan, guardrails.fs_guard.allowed_extensions)
+        mode = "block" if args.block else "audit"
+        scanned = flagged = 0
+        started = time.perf_counter()
+        for file_path, violations in guardrails.validate_many(files, args.workers, mode):
+            scanned += 1
+            if violations:
+                flagged += 1
+            for v in violations:
+                print(f"{file_path}: {v.severity.upper()} {v.category} - {v.description}")
+        print(f"Scanned {scanned} files in {time.perf_counter() - started:.2f}s, {flagged} with findings")
+    
+    elif args.benchmark:
+        print(f"{'RULES':<11} {'FILES':>6} {'MB':>8} {'FOUND':>7} {'SAME':>5} {'PER-RULE MB/S':>14} {'1-PASS MB/S':>12}")
+        for row in benchmark_rules(args.benchmark, args.repeat):
+            print(f"{row['rules']:<11} {row['files']:>6} {row['megabytes']:>8} {row['violations']:>7} "
+                  f"{'yes' if row['identical'] else 'NO':>5} {row['per_rule_mb_s']:>14} "
+                  f"{row['single_pass_mb_s']:>12}")
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
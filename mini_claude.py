@@ -7,19 +7,29 @@ Built by Claude Senior Engineer to handle routine development work
 import os
 import sys
 import json
+import re
+import atexit
 import logging
+import logging.handlers
 import argparse
 import subprocess
 import tempfile
 import hashlib
+import copy
+import math
+import string
 import time
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass
+from typing import Dict, List, Optional, Any, Callable, Iterator, Tuple
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
 import sqlite3
 import threading
 import signal
+from queue import Queue, Empty, Full
+
+from guardrails import compile_rules
 
 try:
     import anthropic
@@ -39,6 +49,36 @@ class Task:
     completed_at: Optional[str] = None
     result: Optional[str] = None
     error: Optional[str] = None
+    priority: int = 5  # 0 is most urgent
+    attempts: int = 0  # Claims so far, including the current one
+    run_after: Optional[float] = None  # Epoch seconds before which the task is not claimed
+    retryable: bool = False  # Failed on a transient error, worth retrying
+    output_sample: Optional[int] = None  # Output tokens of its longest complete response
+    usage: Dict[str, int] = field(default_factory=dict)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct * len(sorted_values) / 100) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+class StageTimer:
+    """Records the wall time of a block in task.timings (milliseconds)"""
+    
+    def __init__(self, task: Task, stage: str):
+        self.task = task
+        self.stage = stage
+    
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = (time.perf_counter() - self.started) * 1000
+        self.task.timings[self.stage] = round(self.task.timings.get(self.stage, 0) + elapsed, 3)
+        return False
 
 class SecurityGuardrails:
     """Security guardrails to prevent unsafe operations"""
@@ -64,74 +104,586 @@ class SecurityGuardrails:
         "refactor_function"
     ]
     
+    @classmethod
+    def _rules(cls):
+        """FORBIDDEN_PATTERNS as case-insensitive literals, matched in one pass"""
+        return compile_rules(tuple(
+            (re.escape(pattern), "critical", "forbidden_pattern", "Forbidden pattern")
+            for pattern in cls.FORBIDDEN_PATTERNS
+        ))
+    
     @classmethod
     def validate_task(cls, task: Task) -> bool:
         """Validate that a task is safe to execute"""
         if task.task_type not in cls.ALLOWED_OPERATIONS:
             return False
-            
-        task_content = str(task.parameters)
-        for pattern in cls.FORBIDDEN_PATTERNS:
-            if pattern in task_content.lower():
-                return False
-                
-        return True
+        
+        # Stops at the first forbidden pattern
+        return not cls._rules().scan(str(task.parameters), stop_severity="critical")
     
     @classmethod
     def validate_code(cls, code: str) -> bool:
         """Validate generated code for safety"""
-        for pattern in cls.FORBIDDEN_PATTERNS:
-            if pattern in code.lower():
+        return not cls._rules().scan(code, stop_severity="critical")
+
+class StreamScanner:
+    """Incremental forbidden-pattern scanner for streamed LLM output
+    
+    Keeps the last len(longest pattern) - 1 characters between chunks so
+    patterns split across chunk boundaries are still detected. Those
+    characters are also held back from release() until the next chunk
+    passes, so no part of a split pattern is shown before it is caught.
+    """
+    
+    def __init__(self, patterns: Optional[List[str]] = None):
+        self.patterns = [p.lower() for p in (patterns or SecurityGuardrails.FORBIDDEN_PATTERNS)]
+        self.overlap = max((len(p) for p in self.patterns), default=1) - 1
+        self.tail = ""
+        self.released = ""
+        self.violation: Optional[str] = None
+    
+    def feed(self, chunk: str) -> bool:
+        """Scan the next chunk; returns False once a forbidden pattern is seen"""
+        if self.violation:
+            return False
+        
+        window = self.tail + chunk
+        lowered = window.lower()
+        for pattern in self.patterns:
+            if pattern in lowered:
+                self.violation = pattern
                 return False
+        
+        split = max(len(window) - self.overlap, 0)
+        self.released, self.tail = window[:split], window[split:]
         return True
+    
+    def release(self) -> str:
+        """Text from the last feed() that can no longer start a forbidden pattern"""
+        text, self.released = self.released, ""
+        return text
+    
+    def flush(self) -> str:
+        """The held-back tail, once the stream has ended cleanly"""
+        text, self.tail = self.tail, ""
+        return text
+
+class JSONLogFormatter(logging.Formatter):
+    """Formats log records as single-line JSON objects"""
+    
+    FIELDS = ["event", "task_id", "task_type", "stage", "duration_ms", "status"]
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for name in self.FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        # The traceback is captured by StructuredQueueHandler.prepare, since
+        # exc_info is cleared before the record reaches the writer thread
+        exception = getattr(record, "exception", None)
+        if exception is None and record.exc_info:
+            exception = self.formatException(record.exc_info)
+        if exception:
+            entry["exception"] = exception
+        return json.dumps(entry, default=str)
+
+class TextLogFormatter(logging.Formatter):
+    """Plain text formatter that appends the traceback captured in prepare"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        exception = getattr(record, "exception", None)
+        return f"{text}\n{exception}" if exception else text
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps tracebacks apart from the message
+    
+    The stock prepare folds the traceback into msg; here it is kept in
+    record.exception so the JSON log can put it in its own field. When the
+    queue is full records are dropped instead of blocking the caller, and
+    the number dropped is logged once there is room again.
+    """
+    
+    def __init__(self, log_queue: Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        exception = []
+        if record.exc_info:
+            exception.append(logging.Formatter().formatException(record.exc_info))
+        if record.stack_info:
+            exception.append(record.stack_info)
+        if exception:
+            record.exception = "\n".join(exception)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        record.stack_info = None
+        return record
+    
+    def enqueue(self, record: logging.LogRecord):
+        with self._dropped_lock:
+            try:
+                if self.dropped:
+                    self.queue.put_nowait(logging.makeLogRecord({
+                        "name": record.name, "levelno": logging.WARNING, "levelname": "WARNING",
+                        "msg": f"LOG_DROPPED: {self.dropped} records - log queue full",
+                        "event": "log_dropped"
+                    }))
+                    self.dropped = 0
+                self.queue.put_nowait(record)
+            except Full:
+                self.dropped += 1
+
+class BatchedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotating file handler that writes a batch of records with one flush"""
+    
+    def emit_batch(self, records: List[logging.LogRecord]):
+        self.acquire()
+        try:
+            for record in records:
+                try:
+                    if self.shouldRollover(record):
+                        self.doRollover()
+                    if self.stream is None:
+                        self.stream = self._open()
+                    self.stream.write(self.format(record) + self.terminator)
+                except Exception:
+                    self.handleError(record)
+            if self.stream:
+                self.stream.flush()
+        finally:
+            self.release()
+
+class AsyncLogWriter:
+    """Background thread that drains queued log records in batches
+    
+    Producers only put records on a bounded queue and drop them when it is
+    full, so logging never blocks task execution on disk or terminal I/O,
+    and a stalled disk costs lost log lines rather than unbounded memory.
+    """
+    
+    _STOP = object()
+    
+    def __init__(self, log_queue: Queue, handlers: List[logging.Handler], batch_size: int = 256):
+        self.queue = log_queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self._thread = threading.Thread(target=self._run, name="mini-claude-log-writer", daemon=True)
+        self._thread.start()
+    
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except Empty:
+                    break
+            
+            stop = self._STOP in batch
+            records = [r for r in batch if r is not self._STOP]
+            for handler in self.handlers:
+                if hasattr(handler, "emit_batch"):
+                    handler.emit_batch(records)
+                else:
+                    for record in records:
+                        if record.levelno >= handler.level:
+                            handler.handle(record)
+            if stop:
+                return
+    
+    def stop(self):
+        """Write out everything queued so far and stop the thread"""
+        self.queue.put(self._STOP)
+        self._thread.join()
+        for handler in self.handlers:
+            handler.close()
 
 class ActivityLogger:
-    """Comprehensive activity logging"""
+    """Comprehensive activity logging
+    
+    Records go through a QueueHandler to a background AsyncLogWriter that
+    writes JSON lines to a size-rotated log file and plain text to stderr.
+    """
     
-    def __init__(self, log_file: str = "activity.log"):
+    _writers: Dict[str, AsyncLogWriter] = {}
+    _writers_lock = threading.Lock()
+    
+    def __init__(self, log_file: str = "activity.log", max_size: int = 10485760,
+                 backup_count: int = 5, level: str = "INFO", max_queue: int = 10000):
         self.log_file = log_file
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(log_file),
-                logging.StreamHandler()
-            ]
-        )
+        self._setup_pipeline(log_file, max_size, backup_count, level, max_queue)
         self.logger = logging.getLogger(__name__)
+        self._started: Dict[str, float] = {}
+        self._started_lock = threading.Lock()
+    
+    @classmethod
+    def _setup_pipeline(cls, log_file: str, max_size: int, backup_count: int, level: str,
+                        max_queue: int):
+        """Attach one queue-backed pipeline per log file to the root logger"""
+        with cls._writers_lock:
+            if log_file in cls._writers:
+                return
+            
+            file_handler = BatchedRotatingFileHandler(
+                log_file, maxBytes=max_size, backupCount=backup_count
+            )
+            file_handler.setFormatter(JSONLogFormatter())
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(TextLogFormatter('%(asctime)s - %(levelname)s - %(message)s'))
+            
+            log_queue = Queue(maxsize=max_queue)
+            cls._writers[log_file] = AsyncLogWriter(log_queue, [file_handler, console_handler])
+            
+            root = logging.getLogger()
+            root.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+            root.addHandler(StructuredQueueHandler(log_queue))
+            atexit.register(cls._writers[log_file].stop)
+    
+    def _event(self, level: int, event: str, message: str, task: Optional[Task] = None, **fields):
+        """Log a message with structured fields for the JSON log"""
+        extra = {"event": event, **fields}
+        if task is not None:
+            extra.setdefault("task_id", task.id)
+            extra.setdefault("task_type", task.task_type)
+        self.logger.log(level, message, extra=extra)
     
     def log_task_start(self, task: Task):
-        self.logger.info(f"TASK_START: {task.id} - {task.task_type} - {task.description}")
+        with self._started_lock:
+            self._started[task.id] = time.perf_counter()
+        self._event(logging.INFO, "task_start",
+                    f"TASK_START: {task.id} - {task.task_type} - {task.description}",
+                    task, stage="start")
     
     def log_task_complete(self, task: Task):
-        self.logger.info(f"TASK_COMPLETE: {task.id} - Status: {task.status}")
+        with self._started_lock:
+            started = self._started.pop(task.id, None)
+        duration_ms = round((time.perf_counter() - started) * 1000, 3) if started else None
+        self._event(logging.INFO, "task_complete",
+                    f"TASK_COMPLETE: {task.id} - Status: {task.status}",
+                    task, stage="complete", status=task.status, duration_ms=duration_ms)
+        if task.usage:
+            self.log_token_usage(task)
+    
+    def log_token_usage(self, task: Task):
+        usage = task.usage
+        self._event(
+            logging.INFO, "token_usage",
+            f"TOKEN_USAGE: {task.id} - {task.task_type} - "
+            f"input={usage.get('input_tokens', 0)} output={usage.get('output_tokens', 0)} "
+            f"cache_read={usage.get('cache_read_input_tokens', 0)} "
+            f"cache_write={usage.get('cache_creation_input_tokens', 0)}",
+            task, stage="llm"
+        )
+    
+    def log_task_coalesced(self, task: Task, leader: Task, stats: Dict[str, Any]):
+        self._event(
+            logging.INFO, "task_coalesced",
+            f"TASK_COALESCED: {task.id} -> {leader.id} - Status: {task.status} - "
+            f"hit_rate={stats['hit_rate']} ({stats['coalesced']}/{stats['executions'] + stats['coalesced']})",
+            task, stage="complete", status=task.status
+        )
     
     def log_security_violation(self, task: Task, reason: str):
-        self.logger.warning(f"SECURITY_VIOLATION: {task.id} - {reason}")
+        with self._started_lock:
+            self._started.pop(task.id, None)
+        self._event(logging.WARNING, "security_violation",
+                    f"SECURITY_VIOLATION: {task.id} - {reason}",
+                    task, stage="guardrails", status="failed")
     
     def log_error(self, task_id: str, error: str):
-        self.logger.error(f"ERROR: {task_id} - {error}")
+        with self._started_lock:
+            self._started.pop(task_id, None)
+        self._event(logging.ERROR, "error", f"ERROR: {task_id} - {error}", task_id=task_id)
+
+class ResponseCache:
+    """Persistent content-addressed cache of LLM responses backed by SQLite"""
+    
+    def __init__(self, db_path: str = "llm_cache.db", ttl: int = 86400,
+                 max_size: int = 104857600):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self._local = threading.local()
+        self._init_database()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Get this thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+            self._local.conn = conn
+        return conn
+    
+    def close(self):
+        """Close this thread's connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+    
+    def _init_database(self):
+        """Initialize the cache database"""
+        conn = self._connect()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_last_access
+                ON responses(last_access)
+            """)
+    
+    @staticmethod
+    def make_key(model: str, prompt: str, max_tokens: int, system: Optional[str] = None) -> str:
+        """Hash model, rendered prompt and max_tokens into a cache key"""
+        payload = json.dumps([model, system, prompt, max_tokens])
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """Return a cached response, or None on miss or expiry"""
+        now = time.time()
+        with self.lock:
+            conn = self._connect()
+            with conn:
+                row = conn.execute(
+                    "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                
+                if row and self.ttl and now - row[1] > self.ttl:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    row = None
+                
+                if not row:
+                    self.misses += 1
+                    return None
+                
+                conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                self.hits += 1
+                return row[0]
+    
+    def put(self, key: str, response: str):
+        """Store a response and evict least recently used entries over max_size"""
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        if self.max_size and size > self.max_size:
+            return
+        
+        with self.lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("""
+                    INSERT OR REPLACE INTO responses
+                    (key, response, size, created_at, last_access)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (key, response, size, now, now))
+                
+                if self.max_size:
+                    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+                    if total > self.max_size:
+                        cursor = conn.execute(
+                            "SELECT key, size FROM responses ORDER BY last_access ASC"
+                        )
+                        evict = []
+                        for old_key, old_size in cursor:
+                            if total <= self.max_size:
+                                break
+                            evict.append((old_key,))
+                            total -= old_size
+                        conn.executemany("DELETE FROM responses WHERE key = ?", evict)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache hit/miss counters and storage usage"""
+        entries, size = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": entries,
+            "size": size
+        }
+
+class LLMAPIError(Exception):
+    """An API call failed
+    
+    retryable is set only for transient failures: rate limits, overload and
+    other 5xx responses, timeouts and connection errors. Bad requests, auth
+    and not-found errors fail the same way on every attempt. cause names
+    the underlying exception class.
+    """
+    
+    # Statuses the SDK itself treats as transient, besides 5xx
+    RETRYABLE_STATUSES = (408, 409, 429)
+    
+    def __init__(self, message: str, cause: Optional[BaseException] = None):
+        super().__init__(message)
+        self.cause = type(cause).__name__ if cause is not None else None
+        self.retryable = self.is_transient(cause)
+    
+    @classmethod
+    def is_transient(cls, error: Optional[BaseException]) -> bool:
+        """Whether retrying the call could succeed"""
+        # APITimeoutError is a kind of APIConnectionError
+        if isinstance(error, anthropic.APIConnectionError):
+            return True
+        if isinstance(error, anthropic.APIStatusError):
+            return error.status_code in cls.RETRYABLE_STATUSES or error.status_code >= 500
+        return False
+
+class ResponseTruncatedError(Exception):
+    """The model stopped at max_tokens, so the response is incomplete"""
+    
+    def __init__(self, max_tokens: int):
+        super().__init__(f"Response truncated at max_tokens={max_tokens}")
+        self.max_tokens = max_tokens
 
 class LLMInterface:
     """Interface to interact with Anthropic's Claude API"""
     
-    def __init__(self, api_key: str, model: str = "claude-3-haiku-20240307"):
+    USAGE_FIELDS = [
+        "input_tokens",
+        "output_tokens",
+        "cache_creation_input_tokens",
+        "cache_read_input_tokens"
+    ]
+    
+    # Shortest system prefix the API will cache, by model family; shorter
+    # blocks are processed normally, so marking them only hides the miss
+    MIN_CACHEABLE_TOKENS = {
+        "claude-3-haiku": 2048,
+        "claude-3-5-haiku": 2048,
+    }
+    DEFAULT_MIN_CACHEABLE_TOKENS = 1024
+    
+    def __init__(self, api_key: str, model: str = "claude-3-haiku-20240307",
+                 cache: Optional[ResponseCache] = None):
         self.client = Anthropic(api_key=api_key)
         self.model = model
+        self.cache = cache
+    
+    def min_cacheable_tokens(self) -> int:
+        """Minimum prefix length in tokens for prompt caching with this model"""
+        for prefix, tokens in self.MIN_CACHEABLE_TOKENS.items():
+            if self.model.startswith(prefix):
+                return tokens
+        return self.DEFAULT_MIN_CACHEABLE_TOKENS
+    
+    def build_request(self, prompt: str, max_tokens: int, system: Optional[str]) -> Dict[str, Any]:
+        """Build messages API arguments, marking the system block cacheable
+        
+        The block is only marked when it is long enough for the model to
+        cache; the estimate errs high, like TokenBudget's.
+        """
+        request = {
+            "model": self.model,
+            "max_tokens": max_tokens,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ]
+        }
+        if system:
+            block = {"type": "text", "text": system}
+            if len(system) / TokenBudget.CHARS_PER_TOKEN >= self.min_cacheable_tokens():
+                block["cache_control"] = {"type": "ephemeral"}
+            request["system"] = [block]
+        return request
+    
+    def record_usage(self, response_usage, usage: Optional[Dict[str, int]]):
+        """Copy token counts (including prompt cache reads/writes) into usage"""
+        if usage is None or response_usage is None:
+            return
+        for name in self.USAGE_FIELDS:
+            usage[name] = usage.get(name, 0) + (getattr(response_usage, name, 0) or 0)
     
-    def generate_response(self, prompt: str, max_tokens: int = 4000) -> str:
-        """Generate response from Claude"""
+    def generate_response(self, prompt: str, max_tokens: int = 4000, use_cache: bool = True,
+                          system: Optional[str] = None, usage: Optional[Dict[str, int]] = None) -> str:
+        """Generate response from Claude
+        
+        If usage is given it is filled with the token counts for the call.
+        Raises ResponseTruncatedError, without caching, if the response
+        stopped at max_tokens.
+        """
+        cache_key = None
+        if self.cache and use_cache:
+            cache_key = ResponseCache.make_key(self.model, prompt, max_tokens, system)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
         try:
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=max_tokens,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            return response.content[0].text
+            response = self.client.messages.create(**self.build_request(prompt, max_tokens, system))
+            text = response.content[0].text
         except Exception as e:
-            raise Exception(f"LLM API Error: {str(e)}")
+            raise LLMAPIError(f"LLM API Error ({type(e).__name__}): {str(e)}", e) from e
+        
+        self.record_usage(getattr(response, "usage", None), usage)
+        if getattr(response, "stop_reason", None) == "max_tokens":
+            raise ResponseTruncatedError(max_tokens)
+        if cache_key:
+            self.cache.put(cache_key, text)
+        return text
+    
+    def stream_response(self, prompt: str, max_tokens: int = 4000, use_cache: bool = True,
+                        system: Optional[str] = None,
+                        usage: Optional[Dict[str, int]] = None) -> Iterator[str]:
+        """Yield response text from Claude as it arrives
+        
+        Closing the generator early closes the underlying HTTP stream, so
+        the API stops generating (and billing) further output tokens.
+        Raises ResponseTruncatedError at the end if the response stopped at
+        max_tokens.
+        """
+        cache_key = None
+        if self.cache and use_cache:
+            cache_key = ResponseCache.make_key(self.model, prompt, max_tokens, system)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        chunks = []
+        try:
+            with self.client.messages.stream(**self.build_request(prompt, max_tokens, system)) as stream:
+                for text in stream.text_stream:
+                    chunks.append(text)
+                    yield text
+                final = stream.get_final_message()
+                self.record_usage(getattr(final, "usage", None), usage)
+        except GeneratorExit:
+            raise
+        except Exception as e:
+            raise LLMAPIError(f"LLM API Error ({type(e).__name__}): {str(e)}", e) from e
+        
+        if getattr(final, "stop_reason", None) == "max_tokens":
+            raise ResponseTruncatedError(max_tokens)
+        
+        # Only complete responses are cached
+        if cache_key:
+            self.cache.put(cache_key, "".join(chunks))
 
 class PromptManager:
     """Manages reusable prompt templates"""
@@ -159,21 +711,229 @@ class PromptManager:
             return template.format(**kwargs)
         except KeyError as e:
             raise ValueError(f"Missing parameter {e} for template {task_type}")
+    
+    def get_prompt_parts(self, task_type: str, **kwargs) -> Tuple[Optional[str], str]:
+        """Split the prompt for a task type into (system, user) parts
+        
+        The system part is the template with every placeholder replaced by a
+        reference to a tagged section, so it is identical for every task of
+        that type and can be prompt-cached. The user part carries only the
+        per-task values, one tagged section per placeholder.
+        """
+        if task_type not in self.templates:
+            return None, self.get_prompt(task_type, **kwargs)
+        
+        template = self.templates[task_type]
+        fields = self._template_fields(template)
+        missing = [name for name in fields if name not in kwargs]
+        if missing:
+            raise ValueError(f"Missing parameter '{missing[0]}' for template {task_type}")
+        
+        system = template.format(**{name: f"<{name}>" for name in fields})
+        payload = "\n\n".join(f"<{name}>\n{kwargs[name]}\n</{name}>" for name in fields)
+        return system, payload
+    
+    def _template_fields(self, template: str) -> List[str]:
+        """Placeholder names in a template, in order of first appearance"""
+        fields = []
+        for _, name, _, _ in string.Formatter().parse(template):
+            if name and name not in fields:
+                fields.append(name)
+        return fields
+
+class InFlightCall:
+    """A task execution that identical tasks can attach to"""
+    
+    def __init__(self, leader: Task):
+        self.leader = leader
+        self.done = threading.Event()
+
+class SingleFlight:
+    """Coalesces identical in-flight tasks onto one execution"""
+    
+    def __init__(self):
+        self._calls: Dict[str, InFlightCall] = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+    
+    def join(self, key: str, task: Task) -> Tuple[InFlightCall, bool]:
+        """Return the call for key and whether the caller leads it"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call:
+                self.coalesced += 1
+                return call, False
+            call = InFlightCall(task)
+            self._calls[key] = call
+            self.executions += 1
+            return call, True
+    
+    def finish(self, key: str, call: InFlightCall):
+        with self._lock:
+            self._calls.pop(key, None)
+        call.done.set()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.executions + self.coalesced
+            return {
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "hit_rate": round(self.coalesced / total, 3) if total else 0.0
+            }
+
+class TokenBudget:
+    """Pre-flight token estimation and per-task-type max_tokens sizing
+    
+    Input size is estimated from the rendered prompt. max_tokens for a task
+    type is the p99 of its recent output lengths times headroom, rounded up
+    to a multiple of 512 so response cache keys stay stable.
+    """
+    
+    CHARS_PER_TOKEN = 3.5
+    MESSAGE_OVERHEAD = 16
+    ROUND_TO = 512
+    
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.context_window = config.get("context_window", 200000)
+        self.default_max_tokens = config.get("default_max_tokens", 4000)
+        self.min_max_tokens = config.get("min_max_tokens", 512)
+        self.max_output_tokens = config.get("max_output_tokens", 4096)
+        self.headroom = config.get("headroom", 1.25)
+        self.history_size = config.get("history_size", 500)
+        self.min_samples = config.get("min_samples", 20)
+        self.splittable_task_types = set(config.get(
+            "splittable_task_types", ["generate_docs", "write_tests"]
+        ))
+        self._history: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+    
+    def estimate_tokens(self, text: Optional[str]) -> int:
+        """Conservative token estimate for a piece of text"""
+        if not text:
+            return 0
+        return int(len(text) / self.CHARS_PER_TOKEN) + 1
+    
+    def estimate_prompt(self, system: Optional[str], prompt: str) -> int:
+        return self.estimate_tokens(system) + self.estimate_tokens(prompt) + self.MESSAGE_OVERHEAD
+    
+    def max_tokens_for(self, task_type: str) -> int:
+        """max_tokens to request for a task type"""
+        with self._lock:
+            history = sorted(self._history.get(task_type, []))
+        if len(history) < self.min_samples:
+            return self.default_max_tokens
+        
+        p99 = percentile(history, 99)
+        wanted = int(p99 * self.headroom)
+        wanted = -(-wanted // self.ROUND_TO) * self.ROUND_TO
+        return max(self.min_max_tokens, min(wanted, self.max_output_tokens))
+    
+    def fits(self, input_tokens: int, max_tokens: int) -> bool:
+        return input_tokens + max_tokens <= self.context_window
+    
+    def observe(self, task_type: str, output_tokens: Optional[int]):
+        """Record the output length of a finished task"""
+        if not output_tokens:
+            return
+        with self._lock:
+            history = self._history.setdefault(task_type, [])
+            history.append(output_tokens)
+            if len(history) > self.history_size:
+                del history[:len(history) - self.history_size]
+    
+    def seed(self, samples: Dict[str, List[int]]):
+        """Load output-length history, e.g. from the task queue"""
+        for task_type, values in samples.items():
+            for value in values:
+                self.observe(task_type, value)
+    
+    def split_text(self, text: str, max_tokens: int) -> List[str]:
+        """Split text on line boundaries into chunks of at most max_tokens"""
+        max_chars = max(int(max_tokens * self.CHARS_PER_TOKEN), 1)
+        chunks, current, size = [], [], 0
+        for line in text.splitlines(keepends=True):
+            while len(line) > max_chars:
+                if current:
+                    chunks.append("".join(current))
+                    current, size = [], 0
+                chunks.append(line[:max_chars])
+                line = line[max_chars:]
+            if size + len(line) > max_chars and current:
+                chunks.append("".join(current))
+                current, size = [], 0
+            current.append(line)
+            size += len(line)
+        if current:
+            chunks.append("".join(current))
+        return chunks
 
 class TaskExecutor:
     """Executes individual tasks with sandboxing"""
     
-    def __init__(self, llm: LLMInterface, prompt_manager: PromptManager, logger: ActivityLogger):
+    def __init__(self, llm: LLMInterface, prompt_manager: PromptManager, logger: ActivityLogger,
+                 budget: Optional[TokenBudget] = None):
         self.llm = llm
         self.prompt_manager = prompt_manager
         self.logger = logger
+        self.budget = budget or TokenBudget()
+        self.inflight = SingleFlight()
+    
+    def execute_task(self, task: Task, on_chunk: Optional[Callable[[str], None]] = None) -> Task:
+        """Execute a single task
+        
+        If on_chunk is given the response is streamed, scanned incrementally
+        and passed to on_chunk as it arrives. Otherwise tasks whose
+        fingerprint matches one already in flight wait for and share its
+        result instead of making their own LLM call.
+        """
+        if on_chunk or task.parameters.get("no_cache", False):
+            return self._execute(task, on_chunk)
+        
+        key = self.fingerprint(task)
+        call, leader = self.inflight.join(key, task)
+        if not leader:
+            self._record_queue_wait(task)
+            with StageTimer(task, "coalesce_wait"):
+                call.done.wait()
+            task.status = call.leader.status
+            task.result = call.leader.result
+            task.error = call.leader.error
+            task.retryable = call.leader.retryable
+            task.completed_at = call.leader.completed_at
+            self.logger.log_task_coalesced(task, call.leader, self.inflight.get_stats())
+            return task
+        
+        try:
+            return self._execute(task, on_chunk)
+        finally:
+            self.inflight.finish(key, call)
     
-    def execute_task(self, task: Task) -> Task:
-        """Execute a single task"""
+    def fingerprint(self, task: Task) -> str:
+        """Hash of task type, normalized parameters and model"""
+        payload = json.dumps(
+            [task.task_type, task.parameters, self.llm.model],
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def _execute(self, task: Task, on_chunk: Optional[Callable[[str], None]] = None) -> Task:
+        started = time.perf_counter()
+        self._record_queue_wait(task)
+        try:
+            return self._run_stages(task, on_chunk)
+        finally:
+            task.timings["total"] = round((time.perf_counter() - started) * 1000, 3)
+    
+    def _run_stages(self, task: Task, on_chunk: Optional[Callable[[str], None]] = None) -> Task:
         self.logger.log_task_start(task)
         
         # Security validation
-        if not SecurityGuardrails.validate_task(task):
+        with StageTimer(task, "guardrails_task"):
+            allowed = SecurityGuardrails.validate_task(task)
+        if not allowed:
             task.status = "failed"
             task.error = "Security violation detected"
             self.logger.log_security_violation(task, task.error)
@@ -181,33 +941,176 @@ class TaskExecutor:
         
         try:
             # Generate prompt
-            prompt = self.prompt_manager.get_prompt(task.task_type, **task.parameters)
+            with StageTimer(task, "render"):
+                system, prompt = self.build_prompt(task)
             
-            # Call LLM
-            response = self.llm.generate_response(prompt)
+            # Size the request before sending it
+            max_tokens = self.budget.max_tokens_for(task.task_type)
+            input_tokens = self.budget.estimate_prompt(system, prompt)
+            split = not self.budget.fits(input_tokens, max_tokens)
+            if split and (on_chunk or not self._can_split(task)):
+                raise ValueError(
+                    f"Input too large: ~{input_tokens} tokens plus max_tokens={max_tokens} "
+                    f"exceeds the {self.budget.context_window} token context window"
+                )
             
-            # Validate response
-            if not SecurityGuardrails.validate_code(response):
-                task.status = "failed"
-                task.error = "Generated code failed security validation"
-                self.logger.log_security_violation(task, task.error)
-                return task
-            
-            # Execute in sandbox if needed
-            result = self._execute_in_sandbox(task, response)
+            # Call LLM (tasks can opt out of the response cache with no_cache)
+            use_cache = not task.parameters.get("no_cache", False)
+            with StageTimer(task, "llm"):
+                if on_chunk:
+                    response = self._stream_response(task, system, prompt, max_tokens, use_cache, on_chunk)
+                elif split:
+                    response = self._generate_split(task, system, prompt, max_tokens, use_cache)
+                else:
+                    response = self._generate(task, system, prompt, max_tokens, use_cache)
             
-            task.status = "completed"
-            task.result = result
-            task.completed_at = datetime.now().isoformat()
+            # Streamed responses were already scanned incrementally
+            with StageTimer(task, "guardrails_response"):
+                completed = self.complete_task(task, response, scanned=bool(on_chunk))
+            if not completed:
+                return task
             
         except Exception as e:
             task.status = "failed"
             task.error = str(e)
+            task.retryable = isinstance(e, LLMAPIError) and e.retryable
             self.logger.log_error(task.id, str(e))
         
         self.logger.log_task_complete(task)
         return task
     
+    def _record_queue_wait(self, task: Task):
+        """Time between the task becoming due and the start of execution
+        
+        Delayed and retried tasks count from run_after, so the intended
+        delay or backoff is not reported as queue wait.
+        """
+        if not task.created_at:
+            return
+        try:
+            due = datetime.fromisoformat(task.created_at).timestamp()
+        except ValueError:
+            return
+        waited = time.time() - max(due, task.run_after or 0)
+        task.timings["queue_wait"] = round(max(waited, 0) * 1000, 3)
+    
+    def build_prompt(self, task: Task) -> Tuple[Optional[str], str]:
+        """Render the (system, user) prompt parts for a task"""
+        parameters = {k: v for k, v in task.parameters.items() if k != "no_cache"}
+        return self.prompt_manager.get_prompt_parts(task.task_type, **parameters)
+    
+    def complete_task(self, task: Task, response: Optional[str], scanned: bool = False) -> bool:
+        """Validate an LLM response and store it on the task
+        
+        Returns False if the response failed security validation.
+        """
+        if response is None or (not scanned and not SecurityGuardrails.validate_code(response)):
+            task.status = "failed"
+            task.error = "Generated code failed security validation"
+            self.logger.log_security_violation(task, task.error)
+            return False
+        
+        # Execute in sandbox if needed
+        result = self._execute_in_sandbox(task, response)
+        
+        task.status = "completed"
+        task.result = result
+        task.completed_at = datetime.now().isoformat()
+        return True
+    
+    def _can_split(self, task: Task) -> bool:
+        # Chunk responses are joined as they are, so only list task types
+        # whose outputs concatenate (docs, tests), not format_code or refactors
+        return task.task_type in self.budget.splittable_task_types and isinstance(task.parameters.get("code"), str)
+    
+    def _generate_split(self, task: Task, system: Optional[str], prompt: str,
+                        max_tokens: int, use_cache: bool) -> str:
+        """Run an oversized code task as one request per chunk of its code"""
+        code = task.parameters["code"]
+        overhead = self.budget.estimate_prompt(system, prompt) - self.budget.estimate_tokens(code)
+        chunk_tokens = self.budget.context_window - max_tokens - overhead
+        if chunk_tokens <= 0:
+            raise ValueError("Prompt leaves no room for input in the context window")
+        
+        responses = []
+        for chunk in self.budget.split_text(code, chunk_tokens):
+            chunk_task = Task(id=task.id, description=task.description, task_type=task.task_type,
+                              parameters={**task.parameters, "code": chunk})
+            chunk_system, chunk_prompt = self.build_prompt(chunk_task)
+            responses.append(self._generate(task, chunk_system, chunk_prompt, max_tokens, use_cache))
+        return "\n\n".join(responses)
+    
+    def _generate(self, task: Task, system: Optional[str], prompt: str,
+                  max_tokens: int, use_cache: bool) -> str:
+        """One LLM call, retried once at max_output_tokens if it was cut off
+        
+        Each complete response's output length is observed on its own;
+        truncated ones are not, since they only show the old limit.
+        """
+        while True:
+            usage: Dict[str, int] = {}
+            try:
+                response = self.llm.generate_response(
+                    prompt, max_tokens=max_tokens, use_cache=use_cache, system=system, usage=usage
+                )
+            except ResponseTruncatedError:
+                self._add_usage(task, usage)
+                larger = self.budget.max_output_tokens
+                if max_tokens >= larger or not self.budget.fits(
+                        self.budget.estimate_prompt(system, prompt), larger):
+                    raise
+                self.logger.logger.warning(
+                    f"TASK_TRUNCATED: {task.id} - retrying with max_tokens={larger} instead of {max_tokens}"
+                )
+                max_tokens = larger
+                continue
+            self._add_usage(task, usage)
+            self.observe_output(task, usage)
+            return response
+    
+    def _add_usage(self, task: Task, usage: Dict[str, int]):
+        for name, value in usage.items():
+            task.usage[name] = task.usage.get(name, 0) + value
+    
+    def observe_output(self, task: Task, usage: Dict[str, int]):
+        """Record one complete response's output length"""
+        output_tokens = usage.get("output_tokens")
+        if not output_tokens:
+            return
+        self.budget.observe(task.task_type, output_tokens)
+        task.output_sample = max(task.output_sample or 0, output_tokens)
+    
+    def _stream_response(self, task: Task, system: Optional[str], prompt: str, max_tokens: int,
+                         use_cache: bool, on_chunk: Callable[[str], None]) -> Optional[str]:
+        """Stream a response through the incremental scanner
+        
+        Returns None and cancels the stream as soon as a forbidden pattern
+        is seen. A response cut off at max_tokens cannot be retried once
+        shown, so ResponseTruncatedError fails the task.
+        """
+        scanner = StreamScanner()
+        chunks = []
+        usage: Dict[str, int] = {}
+        stream = self.llm.stream_response(
+            prompt, max_tokens=max_tokens, use_cache=use_cache, system=system, usage=usage
+        )
+        try:
+            for text in stream:
+                if not scanner.feed(text):
+                    return None
+                chunks.append(text)
+                released = scanner.release()
+                if released:
+                    on_chunk(released)
+        finally:
+            stream.close()
+            self._add_usage(task, usage)
+        released = scanner.flush()
+        if released:
+            on_chunk(released)
+        self.observe_output(task, usage)
+        return "".join(chunks)
+    
     def _execute_in_sandbox(self, task: Task, code: str) -> str:
         """Execute code in a safe sandbox environment"""
         if task.task_type in ["write_tests", "format_code"]:
@@ -220,19 +1123,151 @@ class TaskExecutor:
             # For other tasks, return the LLM response
             return code
 
+@dataclass
+class SlotMetrics:
+    """Per-slot counters for the daemon worker pool"""
+    slot_id: int
+    tasks_completed: int = 0
+    tasks_failed: int = 0
+    busy_seconds: float = 0.0
+    current_task: Optional[str] = None
+    last_task: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "slot": self.slot_id,
+            "completed": self.tasks_completed,
+            "failed": self.tasks_failed,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "current_task": self.current_task,
+            "last_task": self.last_task
+        }
+
+class TaskPool:
+    """Bounded pool of worker slots that run queued tasks concurrently"""
+    
+    def __init__(self, executor: TaskExecutor, queue, logger: ActivityLogger, max_workers: int = 3):
+        self.executor = executor
+        self.queue = queue
+        self.logger = logger
+        self.max_workers = max(1, int(max_workers))
+        self.slots = [SlotMetrics(slot_id=i) for i in range(self.max_workers)]
+        self._free_slots = list(range(self.max_workers))
+        self._in_flight: Dict[Future, int] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="mini-claude-slot")
+    
+    def free_slots(self) -> int:
+        with self._lock:
+            return len(self._free_slots)
+    
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._in_flight)
+    
+    def running_task_ids(self) -> List[str]:
+        """IDs of the tasks currently on a slot"""
+        with self._lock:
+            return [slot.current_task for slot in self.slots if slot.current_task]
+    
+    def submit(self, task: Task) -> Future:
+        """Run a claimed task on the next free slot"""
+        with self._lock:
+            if not self._free_slots:
+                raise RuntimeError("No free worker slot available")
+            slot_id = self._free_slots.pop(0)
+            self.slots[slot_id].current_task = task.id
+            future = self._pool.submit(self._run, slot_id, task)
+            self._in_flight[future] = slot_id
+        future.add_done_callback(self._release)
+        return future
+    
+    def _run(self, slot_id: int, task: Task) -> Task:
+        slot = self.slots[slot_id]
+        started = time.perf_counter()
+        try:
+            completed_task = self.executor.execute_task(task)
+        except Exception as e:
+            task.status = "failed"
+            task.error = str(e)
+            completed_task = task
+            self.logger.log_error(task.id, str(e))
+        
+        try:
+            if completed_task.retryable and self.queue.can_retry(completed_task):
+                stored = self.queue.retry_later(completed_task)
+                if stored:
+                    self.logger.logger.warning(
+                        f"TASK_RETRY: {task.id} - attempt {completed_task.attempts} failed, "
+                        f"retrying in {completed_task.run_after - time.time():.0f}s"
+                    )
+            else:
+                stored = self.queue.update_task_status(completed_task)
+            if not stored:
+                # The lease ran out and the task was requeued or claimed again
+                self.logger.logger.warning(f"TASK_STALE: {task.id} - lease lost, result dropped")
+        except Exception as e:
+            self.logger.log_error(task.id, f"Failed to store result: {e}")
+        
+        with self._lock:
+            slot.busy_seconds += time.perf_counter() - started
+            if completed_task.status == "completed":
+                slot.tasks_completed += 1
+            else:
+                slot.tasks_failed += 1
+            slot.last_task = task.id
+            slot.current_task = None
+        return completed_task
+    
+    def _release(self, future: Future):
+        with self._lock:
+            slot_id = self._in_flight.pop(future, None)
+            if slot_id is not None:
+                self._free_slots.append(slot_id)
+    
+    def wait_for_slot(self, timeout: Optional[float] = None):
+        """Block until at least one in-flight task finishes"""
+        with self._lock:
+            pending = list(self._in_flight)
+        if pending:
+            wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+    
+    def drain(self):
+        """Wait for all in-flight tasks to finish and stop the pool"""
+        self._pool.shutdown(wait=True)
+    
+    def get_metrics(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [slot.to_dict() for slot in self.slots]
+
 class MiniClaude:
     """Main Mini-Claude agent class"""
     
+    # Shortest daemon sleep, so an overdue timer cannot turn the loop into a spin
+    MIN_WAIT = 0.05
+    
     def __init__(self, config_file: str = "config.json"):
         self.config = self._load_config(config_file)
-        self.logger = ActivityLogger()
+        log_config = self.config.get("logging", {})
+        self.logger = ActivityLogger(
+            log_file=log_config.get("file", "activity.log"),
+            max_size=log_config.get("max_size", 10485760),
+            backup_count=log_config.get("backup_count", 5),
+            level=log_config.get("level", "INFO"),
+            max_queue=log_config.get("max_queue", 10000)
+        )
+        self.cache = self._create_cache(self.config.get("cache", {}))
         self.llm = LLMInterface(
             self.config.get("anthropic_api_key", os.getenv("ANTHROPIC_API_KEY")),
-            self.config.get("model", "claude-3-haiku-20240307")
+            self.config.get("model", "claude-3-haiku-20240307"),
+            cache=self.cache
         )
         self.prompt_manager = PromptManager()
-        self.executor = TaskExecutor(self.llm, self.prompt_manager, self.logger)
+        self.budget = TokenBudget(self.config.get("token_budget", {}))
+        self.executor = TaskExecutor(self.llm, self.prompt_manager, self.logger, self.budget)
         self.running = False
+        self._stop_event = threading.Event()
+        self._wake = threading.Event()
     
     def _load_config(self, config_file: str) -> Dict[str, Any]:
         """Load configuration from file"""
@@ -242,11 +1277,21 @@ class MiniClaude:
         return {
             "anthropic_api_key": os.getenv("ANTHROPIC_API_KEY"),
             "model": "claude-3-haiku-20240307",
-            "max_concurrent_tasks": 3,
-            "check_interval": 5
+            "max_concurrent_tasks": 3
         }
     
-    def execute_single_task(self, task_description: str, task_type: str = "general", **parameters) -> Dict[str, Any]:
+    def _create_cache(self, cache_config: Dict[str, Any]) -> Optional[ResponseCache]:
+        """Create the LLM response cache if enabled"""
+        if not cache_config.get("enabled", False):
+            return None
+        return ResponseCache(
+            db_path=cache_config.get("path", "llm_cache.db"),
+            ttl=cache_config.get("ttl", 86400),
+            max_size=cache_config.get("max_size", 104857600)
+        )
+    
+    def execute_single_task(self, task_description: str, task_type: str = "general",
+                            on_chunk: Optional[Callable[[str], None]] = None, **parameters) -> Dict[str, Any]:
         """Execute a single task and return result"""
         task = Task(
             id=hashlib.md5(f"{task_description}{time.time()}".encode()).hexdigest()[:8],
@@ -256,7 +1301,7 @@ class MiniClaude:
             created_at=datetime.now().isoformat()
         )
         
-        completed_task = self.executor.execute_task(task)
+        completed_task = self.executor.execute_task(task, on_chunk=on_chunk)
         
         return {
             "task_id": completed_task.id,
@@ -269,9 +1314,26 @@ class MiniClaude:
         """Start Mini-Claude in daemon mode to process queue"""
         from task_queue import TaskQueue
         
-        self.logger.logger.info("Starting Mini-Claude daemon mode")
+        max_workers = self.config.get("max_concurrent_tasks", 3)
+        
+        self.logger.logger.info(f"Starting Mini-Claude daemon mode with {max_workers} worker slots")
         self.running = True
-        queue = TaskQueue()
+        self._stop_event.clear()
+        lease_config = self.config.get("leases", {})
+        queue = TaskQueue(scheduling=self.config.get("scheduling"), leases=lease_config,
+                          retries=self.config.get("retries"))
+        # Renew well before a lease can run out
+        lease_interval = lease_config.get("lease_seconds", 120) / 3
+        last_lease_check = 0.0
+        self.budget.seed(queue.get_output_samples(self.budget.history_size))
+        pool = TaskPool(self.executor, queue, self.logger, max_workers)
+        batcher = self._create_batch_processor(queue)
+        compactor = self._start_compactor(queue)
+        
+        # The loop sleeps until a task is queued, a slot frees up or a signal
+        # arrives; timeouts only cover lease upkeep and batch timers
+        wake = self._wake
+        watcher = queue.watch(wake.set)
         
         # Set up signal handlers
         signal.signal(signal.SIGINT, self._signal_handler)
@@ -279,22 +1341,107 @@ class MiniClaude:
         
         while self.running:
             try:
-                task = queue.get_next_task()
-                if task:
-                    completed_task = self.executor.execute_task(task)
-                    queue.update_task_status(completed_task)
-                else:
-                    time.sleep(self.config.get("check_interval", 5))
+                # Clear before looking, so a wakeup during this pass is not lost
+                wake.clear()
+                if time.time() - last_lease_check >= lease_interval:
+                    self._maintain_leases(queue, pool, batcher)
+                    last_lease_check = time.time()
+                
+                # Backlog task types go to message batches before the pool sees them
+                if batcher:
+                    batcher.tick()
+                
+                # Claim enough tasks to fill every free slot in one round trip
+                free_slots = pool.free_slots()
+                if free_slots:
+                    tasks = queue.claim_batch(free_slots)
+                    for task in tasks:
+                        pool.submit(task).add_done_callback(lambda future: wake.set())
+                    if tasks:
+                        continue
+                
+                timeout = lease_interval - (time.time() - last_lease_check)
+                # A due task can only be claimed once a slot is free; when every
+                # slot is busy, a finishing task sets the wake event instead
+                if free_slots:
+                    next_due = queue.next_due()
+                    if next_due is not None:
+                        timeout = min(timeout, next_due - time.time())
+                if batcher:
+                    timeout = min(timeout, batcher.poll_interval, batcher.max_wait)
+                wake.wait(max(timeout, self.MIN_WAIT))
             except Exception as e:
                 self.logger.log_error("daemon", str(e))
-                time.sleep(10)
+                self._stop_event.wait(10)
+        
+        watcher.stop()
+        if compactor:
+            compactor.stop()
+        
+        # Graceful drain: no new claims, let in-flight tasks finish
+        self.logger.logger.info(f"Draining {pool.in_flight()} in-flight tasks...")
+        pool.drain()
+        if batcher:
+            batcher.drain()
+        for slot in pool.get_metrics():
+            self.logger.logger.info(f"SLOT_METRICS: {json.dumps(slot)}")
+        if self.cache:
+            self.logger.logger.info(f"CACHE_STATS: {json.dumps(self.cache.get_stats())}")
+        self.logger.logger.info(f"COALESCE_STATS: {json.dumps(self.executor.inflight.get_stats())}")
+        self.logger.logger.info("Mini-Claude daemon stopped")
+    
+    def _maintain_leases(self, queue, pool: TaskPool, batcher):
+        """Heartbeat this daemon's tasks and reclaim tasks of dead workers"""
+        task_ids = pool.running_task_ids()
+        if batcher:
+            task_ids.extend(batcher.task_ids())
+        queue.heartbeat(task_ids)
+        
+        for task_id, status in queue.sweep_expired():
+            if status == "dead":
+                self.logger.log_error(task_id, "Lease expired too many times, moved to dead letter")
+            else:
+                self.logger.logger.warning(f"LEASE_EXPIRED: {task_id} - requeued")
+    
+    def _start_compactor(self, queue):
+        """Archive old finished tasks in the background if retention is configured"""
+        retention = self.config.get("retention", {})
+        if not retention.get("days") or not hasattr(queue.backend, "compact"):
+            return None
+        
+        from task_queue import Compactor
+        
+        def report(archived, error):
+            if error:
+                self.logger.log_error("compactor", f"Compaction failed: {error}")
+            elif archived:
+                self.logger.logger.info(f"COMPACTED: {archived} tasks older than {retention['days']} days archived")
+        
+        return Compactor(queue.backend, retention["days"], retention.get("interval", 3600),
+                         retention.get("batch_size", 500), report)
+    
+    def _create_batch_processor(self, queue):
+        """Create the batch processor if batch mode is enabled"""
+        batch_config = self.config.get("batch", {})
+        if not batch_config.get("enabled", False):
+            return None
+        
+        from batch_mode import BatchProcessor, AnthropicBatchTransport, LocalBatchTransport
+        
+        if batch_config.get("transport", "anthropic") == "local":
+            transport = LocalBatchTransport()
+        else:
+            transport = AnthropicBatchTransport(self.llm.client)
+        return BatchProcessor(queue, self.executor, transport, self.logger, batch_config)
     
     def _signal_handler(self, signum, frame):
         """Handle shutdown signals"""
         self.logger.logger.info(f"Received signal {signum}, shutting down...")
         self.running = False
+        self._stop_event.set()
+        self._wake.set()
 
-def main():
+def main(argv: Optional[List[str]] = None):
     parser = argparse.ArgumentParser(description="Mini-Claude: Lightweight AI Agent")
     parser.add_argument("--task", help="Task description to execute")
     parser.add_argument("--type", default="general", help="Task type")
@@ -302,8 +1449,10 @@ def main():
     parser.add_argument("--config", default="config.json", help="Config file path")
     parser.add_argument("--file", help="File to process")
     parser.add_argument("--code", help="Code to process")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the LLM response cache")
+    parser.add_argument("--stream", action="store_true", help="Stream the response to stderr as it arrives")
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
     if not os.getenv("ANTHROPIC_API_KEY") and not os.path.exists(args.config):
         print("Error: ANTHROPIC_API_KEY environment variable not set and no config file found")
@@ -319,8 +1468,18 @@ def main():
             parameters["file_path"] = args.file
         if args.code:
             parameters["code"] = args.code
+        if args.no_cache:
+            parameters["no_cache"] = True
             
-        result = mini_claude.execute_single_task(args.task, args.type, **parameters)
+        on_chunk = None
+        if args.stream:
+            def on_chunk(text):
+                sys.stderr.write(text)
+                sys.stderr.flush()
+        
+        result = mini_claude.execute_single_task(args.task, args.type, on_chunk=on_chunk, **parameters)
+        if args.stream:
+            sys.stderr.write("\n")
         print(json.dumps(result, indent=2))
     else:
         print("Use --task 'description' to run a single task or --daemon for queue mode")
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Local RPC Server for Mini-Claude
+Keeps the LLM client, task queue and prompt templates warm behind a UNIX
+domain socket so CLI commands skip interpreter and import startup
+"""
+
+import os
+import json
+import signal
+import socket
+import socketserver
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Iterator
+
+DEFAULT_SOCKET = "mini_claude.sock"
+
+class RPCError(Exception):
+    """Error returned by the RPC server"""
+    pass
+
+class RPCServer:
+    """Serves Mini-Claude operations as newline-delimited JSON over a UNIX socket
+
+    Each connection carries one request {"op": ..., "params": {...}} and
+    gets one response {"result": ...} or {"error": ...}. Streaming
+    operations instead answer with one {"row": ...} line per item, as the
+    queue yields it, followed by {"result": <row count>} or {"error": ...}.
+    """
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, config_file: str = "config.json"):
+        from mini_claude import MiniClaude
+
+        self.socket_path = socket_path
+        self.mini_claude = MiniClaude(config_file)
+        self.queues: Dict[str, Any] = {}
+        self.queues_lock = threading.Lock()
+        self.server: Optional[socketserver.ThreadingUnixStreamServer] = None
+        self.operations = {
+            "ping": self._ping,
+            "task": self._run_task,
+            "submit": self._submit,
+            "get": self._get,
+            "result": self._result
+        }
+        self.streaming_operations = {
+            "list": self._list
+        }
+
+    def _queue(self, backend: str = "sqlite"):
+        """Get a warm queue connection for a backend"""
+        from task_queue import TaskQueue
+
+        with self.queues_lock:
+            if backend not in self.queues:
+                self.queues[backend] = TaskQueue(
+                    backend_type=backend,
+                    scheduling=self.mini_claude.config.get("scheduling"),
+                    leases=self.mini_claude.config.get("leases"),
+                    retries=self.mini_claude.config.get("retries")
+                )
+            return self.queues[backend]
+
+    def _ping(self) -> str:
+        return "pong"
+
+    def _run_task(self, description: str, task_type: str = "general",
+                  parameters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return self.mini_claude.execute_single_task(description, task_type, **(parameters or {}))
+
+    def _submit(self, description: str, task_type: str = "general", priority: int = 5,
+                run_at: Optional[float] = None, backend: str = "sqlite") -> str:
+        return self._queue(backend).submit_task(description, task_type, priority, run_at)
+
+    def _list(self, status: Optional[str] = None, backend: str = "sqlite") -> Iterator[Dict[str, Any]]:
+        for task in self._queue(backend).list_all_tasks(status):
+            yield {"id": task.id, "status": task.status, "description": task.description}
+
+    def _get(self, task_id: str, backend: str = "sqlite") -> Optional[Dict[str, Any]]:
+        return self._queue(backend).get_status(task_id)
+
+    def _result(self, task_id: str, backend: str = "sqlite") -> Optional[str]:
+        return self._queue(backend).get_result(task_id)
+
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Dispatch one request"""
+        operation = self.operations.get(request.get("op"))
+        if not operation:
+            return {"error": f"Unknown operation: {request.get('op')}"}
+        try:
+            return {"result": operation(**request.get("params", {}))}
+        except Exception as e:
+            return {"error": str(e)}
+
+    def responses(self, request: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Response lines for one request, streamed for streaming operations"""
+        operation = self.streaming_operations.get(request.get("op"))
+        if not operation:
+            yield self.handle(request)
+            return
+        count = 0
+        try:
+            for row in operation(**request.get("params", {})):
+                yield {"row": row}
+                count += 1
+        except Exception as e:
+            yield {"error": str(e)}
+            return
+        yield {"result": count}
+
+    def serve_forever(self):
+        """Serve requests until SIGINT/SIGTERM"""
+        rpc = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            # Buffer streamed rows instead of one send per line
+            wbufsize = 65536
+
+            def handle(self):
+                line = self.rfile.readline()
+                try:
+                    responses = rpc.responses(json.loads(line))
+                except ValueError as e:
+                    responses = [{"error": f"Invalid request: {e}"}]
+                for response in responses:
+                    self.wfile.write(json.dumps(response).encode() + b"\n")
+
+        # Remove a socket left behind by a previous server
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        self.server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        self.server.daemon_threads = True
+        os.chmod(self.socket_path, 0o600)
+
+        signal.signal(signal.SIGINT, self._signal_handler)
+        signal.signal(signal.SIGTERM, self._signal_handler)
+
+        self.mini_claude.logger.logger.info(f"RPC server listening on {self.socket_path}")
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self.mini_claude.logger.logger.info("RPC server stopped")
+
+    def _signal_handler(self, signum, frame):
+        """Handle shutdown signals"""
+        # shutdown() blocks until serve_forever returns, so call it off-thread
+        threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+class RPCClient:
+    """Client for a running RPCServer"""
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, timeout: Optional[float] = None):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    @classmethod
+    def connect(cls, socket_path: str = DEFAULT_SOCKET) -> Optional["RPCClient"]:
+        """Return a client if a server is listening on socket_path"""
+        if not Path(socket_path).exists():
+            return None
+        client = cls(socket_path, timeout=1)
+        try:
+            client.call("ping")
+        except (OSError, RPCError):
+            return None
+        client.timeout = None
+        return client
+
+    def call(self, op: str, **params) -> Any:
+        """Send one request and return its result"""
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            sock.sendall(json.dumps({"op": op, "params": params}).encode() + b"\n")
+            with sock.makefile("rb") as reader:
+                line = reader.readline()
+
+        return self._result(line)
+
+    def stream(self, op: str, **params) -> Iterator[Any]:
+        """Send one request to a streaming operation and yield its rows as they arrive"""
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            sock.sendall(json.dumps({"op": op, "params": params}).encode() + b"\n")
+            with sock.makefile("rb") as reader:
+                for line in reader:
+                    response = json.loads(line)
+                    if "row" not in response:
+                        self._result(line)
+                        return
+                    yield response["row"]
+        raise RPCError("Connection closed by server")
+
+    def _result(self, line: bytes) -> Any:
+        """Decode a final response line, raising RPCError for errors"""
+        if not line:
+            raise RPCError("Connection closed by server")
+        response = json.loads(line)
+        if "error" in response:
+            raise RPCError(response["error"])
+        return response.get("result")
+
+def main(argv: Optional[List[str]] = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mini-Claude local RPC server")
+    parser.add_argument("--socket", default=os.getenv("MINI_CLAUDE_SOCKET", DEFAULT_SOCKET),
+                        help="UNIX socket path")
+    parser.add_argument("--config", default="config.json", help="Config file path")
+
+    args = parser.parse_args(argv)
+
+    RPCServer(args.socket, args.config).serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -336,7 +336,7 @@ class UpdateManager:
                 backup_file.unlink()
                 self.logger.info(f"Cleaned up old backup: {backup_file}")
 
-def main():
+def main(argv: Optional[List[str]] = None):
     import argparse
     
     parser = argparse.ArgumentParser(description="Mini-Claude Self-Update Manager")
@@ -346,7 +346,7 @@ def main():
     parser.add_argument("--rollback", help="Rollback update by ID")
     parser.add_argument("--cleanup", type=int, help="Cleanup backups older than N days")
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
     update_manager = UpdateManager()
     
@@ -16,7 +16,7 @@ if requirements_path.exists():
     with open(requirements_path) as f:
         requirements = [line.strip() for line in f if line.strip() and not line.startswith("#")]
 else:
-    requirements = ["anthropic>=0.25.0"]
+    requirements = ["anthropic>=0.41.0"]
 
 setup(
     name="mini-claude",
@@ -31,8 +31,10 @@ setup(
     py_modules=[
         "mini_claude",
         "task_queue", 
+        "batch_mode",
         "self_update",
         "guardrails",
+        "rpc_server",
         "cli"
     ],
     install_requires=requirements,
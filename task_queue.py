@@ -8,14 +8,301 @@ import json
 import sqlite3
 import threading
 import time
-from datetime import datetime
-from typing import List, Optional, Dict, Any
+from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any, Tuple, Iterable, Iterator, Union
 from dataclasses import dataclass, asdict
 from abc import ABC, abstractmethod
+import codecs
 import hashlib
+import itertools
+import mmap
+import os
+import random
+import socket
+import sys
+import zlib
 
 # Import mini_claude Task class
-from mini_claude import Task
+from mini_claude import Task, percentile
+
+USAGE_COLUMNS = [
+    "tasks",
+    "input_tokens",
+    "output_tokens",
+    "cache_creation_input_tokens",
+    "cache_read_input_tokens"
+]
+
+_task_counter = itertools.count()
+_listener_counter = itertools.count()
+
+# Samples kept per (task_type, stage) by backends that cap history
+MAX_STAGE_SAMPLES = 10000
+
+# "scheduled" tasks wait for run_after before becoming pending; "dead"
+# holds tasks whose lease expired max_attempts times
+TASK_STATUSES = ("scheduled", "pending", "processing", "completed", "failed", "dead")
+FINISHED_STATUSES = ("completed", "failed", "dead")
+
+# Every listed task carries LIST_COLUMNS; list_tasks(columns=...) adds
+# any of OPTIONAL_COLUMNS, and leaves result out by default
+LIST_COLUMNS = ("id", "description", "task_type", "parameters", "status", "created_at")
+OPTIONAL_COLUMNS = ("completed_at", "result", "error", "priority", "attempts", "run_after")
+DEFAULT_LIST_COLUMNS = ("completed_at", "error", "priority", "attempts", "run_after")
+# Claims return what a worker needs to run the task, never a stored result
+CLAIM_COLUMNS = LIST_COLUMNS + ("priority", "attempts", "run_after")
+
+# Claims and lease sweeps use UPDATE ... RETURNING
+MIN_SQLITE_VERSION = (3, 35, 0)
+
+# Priority levels, 0 is most urgent
+PRIORITY_LEVELS = range(10)
+DEFAULT_PRIORITY = 5
+
+def clamp_priority(priority: Any) -> int:
+    """Coerce a priority into PRIORITY_LEVELS"""
+    return min(max(int(priority), PRIORITY_LEVELS[0]), PRIORITY_LEVELS[-1])
+
+def to_epoch(run_at: Union[datetime, float, str, None]) -> Optional[float]:
+    """Epoch seconds for a datetime, ISO string or number"""
+    if run_at is None or isinstance(run_at, (int, float)):
+        return run_at
+    if isinstance(run_at, str):
+        run_at = datetime.fromisoformat(run_at)
+    return run_at.timestamp()
+
+class Scheduler:
+    """Picks which pending tasks to claim next
+    
+    A task's effective priority improves by one level for every
+    aging_interval seconds it has waited since it became due (created_at,
+    or run_after for delayed and retried tasks), up to the top level, so bulk
+    low-priority work cannot starve but never overtakes fresh urgent work.
+    At the same effective level the original priority decides, then the
+    task type with the least weighted service so far goes first
+    (type_weights, default 1). Service is counted per process.
+    """
+    
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.aging_interval = config.get("aging_interval", 60)
+        self.type_weights = config.get("type_weights", {})
+        self.served: Dict[str, float] = {}
+        self.lock = threading.Lock()
+    
+    def effective_level(self, priority: int, created_at: str, now: float,
+                        run_after: Optional[float] = None) -> int:
+        """Priority level after aging, never above the top level"""
+        if not self.aging_interval:
+            return priority
+        try:
+            due = datetime.fromisoformat(created_at).timestamp()
+        except (TypeError, ValueError):
+            return priority
+        waited = now - max(due, run_after or 0)
+        return max(priority - int(max(waited, 0) // self.aging_interval), PRIORITY_LEVELS[0])
+    
+    def select(self, candidates: Iterable[Tuple[str, str, int, str, Optional[float]]],
+               limit: int) -> List[str]:
+        """Order (id, task_type, priority, created_at, run_after) candidates and return up to limit IDs"""
+        now = time.time()
+        by_type: Dict[str, List[Tuple[int, int, str, str]]] = {}
+        for task_id, task_type, priority, created_at, run_after in candidates:
+            level = self.effective_level(priority, created_at, now, run_after)
+            by_type.setdefault(task_type, []).append((level, priority, created_at, task_id))
+        for heads in by_type.values():
+            heads.sort(reverse=True)  # Best candidate last, so pop() takes it
+    
+        with self.lock:
+            # Types seen for the first time start level with the least served type
+            floor = min(self.served.values(), default=0.0)
+            served = {task_type: self.served.get(task_type, floor) for task_type in by_type}
+    
+        selected = []
+        while by_type and len(selected) < limit:
+            task_type = min(by_type, key=lambda t: (by_type[t][-1][0], by_type[t][-1][1],
+                                                    served[t], by_type[t][-1][2]))
+            heads = by_type[task_type]
+            selected.append(heads.pop()[3])
+            served[task_type] += 1 / self.type_weights.get(task_type, 1)
+            if not heads:
+                del by_type[task_type]
+        return selected
+    
+    def charge(self, tasks: Iterable[Task]):
+        """Count claimed tasks against their type's fair share"""
+        with self.lock:
+            floor = min(self.served.values(), default=0.0)
+            for task in tasks:
+                self.served[task.task_type] = (
+                    self.served.get(task.task_type, floor) + 1 / self.type_weights.get(task.task_type, 1)
+                )
+
+class LocalNotifier:
+    """Wakes idle consumers on this host when tasks are queued
+    
+    Each listener binds a UNIX datagram socket in directory; notify() sends
+    one byte to every socket there and removes sockets of dead listeners.
+    Listeners block in recv, so waiting costs no CPU or disk I/O.
+    """
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+    
+    def notify(self):
+        """Wake every listener, never blocking the caller"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.setblocking(False)
+            for name in names:
+                path = os.path.join(self.directory, name)
+                try:
+                    sock.sendto(b"!", path)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # Listener exited without cleaning up
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+                except OSError:
+                    # Listener's buffer is full, it has a wakeup pending anyway
+                    pass
+    
+    def listen(self, callback) -> "LocalListener":
+        """Call callback from a background thread on every notification"""
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        return LocalListener(self.directory, callback)
+
+class LocalListener:
+    """Background thread behind LocalNotifier.listen"""
+    
+    def __init__(self, directory: str, callback):
+        self.callback = callback
+        self.path = os.path.join(directory, f"{os.getpid()}-{next(_listener_counter)}.sock")
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.path)
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="mini-claude-queue-listener", daemon=True)
+        self._thread.start()
+    
+    def _run(self):
+        while True:
+            try:
+                self.sock.recv(64)
+            except OSError:
+                return
+            if self._stopped:
+                return
+            self.callback()
+    
+    def stop(self):
+        """Stop listening and remove the socket"""
+        self._stopped = True
+        try:
+            # Unblock recv
+            with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+                sock.sendto(b"!", self.path)
+        except OSError:
+            pass
+        self._thread.join(timeout=1)
+        self.sock.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+class BlobStore:
+    """Content-addressed store for large task results
+    
+    Results longer than threshold characters are zlib-compressed into
+    <directory>/<2 hex>/<sha256>, so identical outputs are stored once and
+    the tasks table only keeps the digest. iter_text() maps the file and
+    decompresses it a chunk at a time, so a reader holds one chunk of a
+    blob in memory, not the whole result; read() joins the chunks.
+    """
+    
+    def __init__(self, directory: str, threshold: int = 65536, level: int = 6):
+        self.directory = directory
+        self.threshold = threshold
+        self.level = level
+    
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest)
+    
+    def should_store(self, text: Optional[str]) -> bool:
+        return text is not None and len(text) > self.threshold
+    
+    def put(self, text: str) -> str:
+        """Store text and return its digest"""
+        data = text.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write under a unique name and rename, so readers never see a partial blob
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(zlib.compress(data, self.level))
+            os.replace(tmp_path, path)
+        return digest
+    
+    def iter_text(self, digest: str, chunk_size: int = 65536) -> Iterator[str]:
+        """Yield the text stored under digest in pieces of at most chunk_size bytes"""
+        decompressor = zlib.decompressobj()
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        with open(self._path(digest), 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for offset in range(0, len(mapped), chunk_size):
+                    data = mapped[offset:offset + chunk_size]
+                    # max_length bounds each piece even for highly compressible text
+                    while data:
+                        text = decoder.decode(decompressor.decompress(data, chunk_size))
+                        data = decompressor.unconsumed_tail
+                        if text:
+                            yield text
+        text = decoder.decode(decompressor.flush(), final=True)
+        if text:
+            yield text
+    
+    def read(self, digest: str) -> str:
+        """Load the text stored under digest"""
+        return "".join(self.iter_text(digest))
+
+class Compactor:
+    """Background thread running backend.compact() every interval seconds
+    
+    callback(archived, error) is called after each pass.
+    """
+    
+    def __init__(self, backend, retention_days: float, interval: float = 3600,
+                 batch_size: int = 500, callback=None):
+        self.backend = backend
+        self.retention_days = retention_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.callback = callback
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="mini-claude-queue-compactor", daemon=True)
+        self._thread.start()
+    
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                archived, error = self.backend.compact(self.retention_days, self.batch_size), None
+            except (sqlite3.Error, OSError) as e:
+                archived, error = 0, e
+            if self.callback:
+                self.callback(archived, error)
+            self._stop.wait(self.interval)
+        self.backend.close()
+    
+    def stop(self):
+        """Stop after the batch in progress"""
+        self._stop.set()
+        self._thread.join(timeout=5)
 
 class QueueBackend(ABC):
     """Abstract base class for queue backends"""
@@ -28,29 +315,156 @@ class QueueBackend(ABC):
     def get_next_task(self) -> Optional[Task]:
         pass
     
+    @abstractmethod
+    def add_tasks(self, tasks: Iterable[Task]) -> List[str]:
+        pass
+    
+    @abstractmethod
+    def claim_batch(self, limit: int, task_types: Optional[List[str]] = None) -> List[Task]:
+        pass
+    
     @abstractmethod
     def update_task_status(self, task: Task) -> bool:
         pass
     
+    @abstractmethod
+    def heartbeat(self, task_ids: Iterable[str]) -> int:
+        pass
+    
+    @abstractmethod
+    def sweep_expired(self) -> List[Tuple[str, str]]:
+        pass
+    
+    @abstractmethod
+    def next_due(self) -> Optional[float]:
+        """Epoch seconds when the earliest scheduled task becomes due"""
+        pass
+    
+    @abstractmethod
+    def listen(self, callback):
+        """Call callback whenever tasks may have become claimable; returns a handle with stop()"""
+        pass
+    
     @abstractmethod
     def get_task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
         pass
     
     @abstractmethod
-    def list_tasks(self, status: Optional[str] = None) -> List[Task]:
+    def get_result(self, task_id: str) -> Optional[str]:
+        pass
+    
+    def iter_result(self, task_id: str) -> Optional[Iterator[str]]:
+        """A task's result in pieces, or None if it has none"""
+        result = self.get_result(task_id)
+        return None if result is None else iter([result])
+    
+    @abstractmethod
+    def list_tasks(self, status: Optional[str] = None, page_size: int = 500,
+                   columns: Optional[Iterable[str]] = None) -> Iterator[Task]:
+        pass
+    
+    @abstractmethod
+    def count_tasks(self, status: Optional[str] = None) -> int:
+        pass
+    
+    @abstractmethod
+    def get_stage_samples(self) -> Dict[Tuple[str, str], List[float]]:
+        pass
+    
+    @abstractmethod
+    def get_usage_totals(self) -> Dict[str, Dict[str, int]]:
+        pass
+    
+    @abstractmethod
+    def get_output_samples(self, limit: int = 500) -> Dict[str, List[int]]:
+        pass
+    
+    @abstractmethod
+    def get_wait_samples(self) -> Dict[int, List[float]]:
         pass
 
 class SQLiteBackend(QueueBackend):
-    """SQLite backend for task storage"""
+    """SQLite backend for task storage
+    
+    Each thread keeps one persistent connection. The database runs in WAL
+    mode with a busy timeout, and tasks are picked and claimed inside one
+    BEGIN IMMEDIATE transaction, so several daemon processes can drain the
+    same database without claiming a task twice.
     
-    def __init__(self, db_path: str = "mini_claude_tasks.db"):
+    A claim holds a lease of lease_seconds that workers renew with
+    heartbeat(). sweep_expired() puts tasks with an expired lease back to
+    pending, or to dead once they have been claimed max_attempts times.
+    
+    Results longer than blob_threshold go to a BlobStore in blob_dir
+    (default <db_path>.blobs) and only their digest is kept in result_digest.
+    
+    compact() moves old finished tasks to monthly databases in archive_dir
+    (default <db_path>.archive), keeping the tasks table and its indexes
+    down to the live queue.
+    """
+    
+    def __init__(self, db_path: str = "mini_claude_tasks.db", busy_timeout: float = 30.0,
+                 scheduler: Optional[Scheduler] = None, lease_seconds: float = 120,
+                 max_attempts: int = 3, blob_dir: Optional[str] = None,
+                 blob_threshold: int = 65536, archive_dir: Optional[str] = None):
+        if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+            raise RuntimeError(
+                f"SQLite backend requires SQLite >= {'.'.join(map(str, MIN_SQLITE_VERSION))}, "
+                f"but Python is linked against {sqlite3.sqlite_version}; "
+                f"use a newer Python build or the Redis backend"
+            )
         self.db_path = db_path
-        self.lock = threading.Lock()
+        self.busy_timeout = busy_timeout
+        self.scheduler = scheduler or Scheduler()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.notifier = LocalNotifier(f"{db_path}.wake")
+        self.blobs = BlobStore(blob_dir or f"{db_path}.blobs", blob_threshold)
+        self.archive_dir = archive_dir or f"{db_path}.archive"
+        self._local = threading.local()
         self._init_database()
     
+    def _connect(self) -> sqlite3.Connection:
+        """Get this thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout)
+            conn.row_factory = sqlite3.Row
+            # Must come before WAL creates the file; older databases need
+            # enable_incremental_vacuum()
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def close(self):
+        """Close this thread's connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+    
+    def _row_to_task(self, row: sqlite3.Row) -> Task:
+        # Listing rows may leave out optional columns
+        columns = row.keys()
+        optional = {name: row[name] for name in OPTIONAL_COLUMNS if name in columns}
+        if "result_digest" in columns and row['result_digest']:
+            optional['result'] = self.blobs.read(row['result_digest'])
+        return Task(
+            id=row['id'],
+            description=row['description'],
+            task_type=row['task_type'],
+            parameters=json.loads(row['parameters']),
+            status=row['status'],
+            created_at=row['created_at'],
+            **optional
+        )
+    
     def _init_database(self):
         """Initialize the SQLite database"""
-        with sqlite3.connect(self.db_path) as conn:
+        conn = self._connect()
+        with conn:
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS tasks (
                     id TEXT PRIMARY KEY,
@@ -62,136 +476,599 @@ class SQLiteBackend(QueueBackend):
                     completed_at TEXT,
                     result TEXT,
                     error TEXT,
-                    priority INTEGER DEFAULT 5
+                    priority INTEGER DEFAULT 5,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    lease_expires REAL,
+                    run_after REAL,
+                    result_digest TEXT
                 )
             """)
+            self._migrate(conn)
             conn.execute("""
                 CREATE INDEX IF NOT EXISTS idx_status_priority 
                 ON tasks(status, priority, created_at)
             """)
-            conn.commit()
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_status_priority_type 
+                ON tasks(status, priority, task_type, created_at)
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_created 
+                ON tasks(created_at, id)
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_status_lease 
+                ON tasks(status, lease_expires)
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_status_run_after 
+                ON tasks(status, run_after)
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_status_created 
+                ON tasks(status, created_at, id)
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS task_timings (
+                    task_id TEXT NOT NULL,
+                    task_type TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    duration_ms REAL NOT NULL,
+                    PRIMARY KEY (task_id, stage)
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_timings_type_stage 
+                ON task_timings(task_type, stage, duration_ms)
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS task_usage (
+                    task_id TEXT PRIMARY KEY,
+                    task_type TEXT NOT NULL,
+                    input_tokens INTEGER DEFAULT 0,
+                    output_tokens INTEGER DEFAULT 0,
+                    cache_creation_input_tokens INTEGER DEFAULT 0,
+                    cache_read_input_tokens INTEGER DEFAULT 0,
+                    output_sample INTEGER
+                )
+            """)
+            usage_columns = {row[1] for row in conn.execute("PRAGMA table_info(task_usage)")}
+            if "output_sample" not in usage_columns:
+                conn.execute("ALTER TABLE task_usage ADD COLUMN output_sample INTEGER")
+    
+    def _migrate(self, conn: sqlite3.Connection):
+        """Add columns missing from databases created by older versions"""
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}
+        if "run_after" not in columns:
+            conn.execute("ALTER TABLE tasks ADD COLUMN run_after REAL")
+        if "result_digest" not in columns:
+            conn.execute("ALTER TABLE tasks ADD COLUMN result_digest TEXT")
+        if "attempts" not in columns:
+            conn.execute("ALTER TABLE tasks ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        if "lease_expires" not in columns:
+            conn.execute("ALTER TABLE tasks ADD COLUMN lease_expires REAL")
+            # Tasks already stuck in processing get one lease to finish in
+            conn.execute(
+                "UPDATE tasks SET lease_expires = ? WHERE status = 'processing'",
+                (time.time() + self.lease_seconds,)
+            )
     
     def add_task(self, task: Task) -> str:
         """Add a task to the queue"""
-        with self.lock:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute("""
-                    INSERT INTO tasks 
-                    (id, description, task_type, parameters, status, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (
+        conn = self._connect()
+        with conn:
+            conn.execute("""
+                INSERT INTO tasks 
+                (id, description, task_type, parameters, status, created_at, priority, run_after)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                task.id,
+                task.description,
+                task.task_type,
+                json.dumps(task.parameters),
+                task.status,
+                task.created_at,
+                task.priority,
+                task.run_after
+            ))
+        self.notifier.notify()
+        return task.id
+    
+    def get_next_task(self) -> Optional[Task]:
+        """Atomically claim the next pending task"""
+        tasks = self.claim_batch(1)
+        return tasks[0] if tasks else None
+    
+    def add_tasks(self, tasks: Iterable[Task]) -> List[str]:
+        """Add many tasks with one executemany in a single transaction"""
+        task_ids = []
+        
+        def rows():
+            for task in tasks:
+                task_ids.append(task.id)
+                yield (
                     task.id,
                     task.description,
                     task.task_type,
                     json.dumps(task.parameters),
                     task.status,
-                    task.created_at
-                ))
-                conn.commit()
-        return task.id
+                    task.created_at,
+                    task.priority,
+                    task.run_after
+                )
+        
+        conn = self._connect()
+        with conn:
+            conn.executemany("""
+                INSERT INTO tasks 
+                (id, description, task_type, parameters, status, created_at, priority, run_after)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows())
+        if task_ids:
+            self.notifier.notify()
+        return task_ids
     
-    def get_next_task(self) -> Optional[Task]:
-        """Get the next pending task"""
-        with self.lock:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.execute("""
-                    SELECT * FROM tasks 
-                    WHERE status = 'pending' 
-                    ORDER BY priority ASC, created_at ASC 
-                    LIMIT 1
-                """)
-                row = cursor.fetchone()
-                
-                if row:
-                    # Mark as processing
-                    conn.execute(
-                        "UPDATE tasks SET status = 'processing' WHERE id = ?",
-                        (row['id'],)
-                    )
-                    conn.commit()
-                    
-                    return Task(
-                        id=row['id'],
-                        description=row['description'],
-                        task_type=row['task_type'],
-                        parameters=json.loads(row['parameters']),
-                        status='processing',
-                        created_at=row['created_at'],
-                        completed_at=row['completed_at'],
-                        result=row['result'],
-                        error=row['error']
-                    )
-        return None
+    def claim_batch(self, limit: int, task_types: Optional[List[str]] = None) -> List[Task]:
+        """Atomically claim up to limit pending tasks, optionally of the given types"""
+        if limit <= 0:
+            return []
+        
+        conn = self._connect()
+        # Take the write lock up front so candidates cannot be claimed under us
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Due scheduled tasks join the pending set; future ones stay out
+            # of the claim indexes entirely
+            conn.execute("""
+                UPDATE tasks SET status = 'pending' 
+                WHERE status = 'scheduled' AND run_after <= ?
+            """, (time.time(),))
+            
+            # Aging keeps each group roughly in created_at order (delayed
+            # tasks age from run_after), so only its oldest limit tasks are
+            # considered
+            candidates = []
+            for priority, task_type in self._pending_groups(conn, task_types):
+                candidates.extend(conn.execute("""
+                    SELECT id, task_type, priority, created_at, run_after FROM tasks 
+                    WHERE status = 'pending' AND priority = ? AND task_type = ?
+                    ORDER BY created_at ASC 
+                    LIMIT ?
+                """, (priority, task_type, limit)).fetchall())
+            
+            task_ids = self.scheduler.select(candidates, limit)
+            rows = []
+            if task_ids:
+                rows = conn.execute(f"""
+                    UPDATE tasks 
+                    SET status = 'processing', lease_expires = ?, attempts = attempts + 1
+                    WHERE id IN ({', '.join('?' for _ in task_ids)})
+                    RETURNING {', '.join(CLAIM_COLUMNS)}
+                """, [time.time() + self.lease_seconds, *task_ids]).fetchall()
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        
+        # RETURNING order is unspecified, restore scheduling order
+        order = {task_id: n for n, task_id in enumerate(task_ids)}
+        tasks = sorted((self._row_to_task(row) for row in rows), key=lambda t: order[t.id])
+        self.scheduler.charge(tasks)
+        return tasks
+    
+    def _pending_groups(self, conn: sqlite3.Connection,
+                        task_types: Optional[List[str]] = None) -> Iterator[Tuple[int, str]]:
+        """Yield (priority, task_type) pairs that have pending tasks"""
+        if task_types:
+            for priority in PRIORITY_LEVELS:
+                for task_type in task_types:
+                    yield priority, task_type
+            return
+        
+        # Skip-scan idx_status_priority_type one group at a time. A row value
+        # comparison would only seek on priority, so step in two queries.
+        row = conn.execute("""
+            SELECT priority, task_type FROM tasks WHERE status = 'pending'
+            ORDER BY priority, task_type LIMIT 1
+        """).fetchone()
+        while row:
+            priority, task_type = row
+            yield priority, task_type
+            row = conn.execute("""
+                SELECT priority, task_type FROM tasks 
+                WHERE status = 'pending' AND priority = ? AND task_type > ?
+                ORDER BY task_type LIMIT 1
+            """, (priority, task_type)).fetchone()
+            if not row:
+                row = conn.execute("""
+                    SELECT priority, task_type FROM tasks 
+                    WHERE status = 'pending' AND priority > ?
+                    ORDER BY priority, task_type LIMIT 1
+                """, (priority,)).fetchone()
     
     def update_task_status(self, task: Task) -> bool:
         """Update task status and results"""
-        with self.lock:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute("""
-                    UPDATE tasks 
-                    SET status = ?, completed_at = ?, result = ?, error = ?
-                    WHERE id = ?
-                """, (
-                    task.status,
-                    task.completed_at,
-                    task.result,
-                    task.error,
-                    task.id
-                ))
-                conn.commit()
-                return conn.total_changes > 0
+        # Large results go to the blob store before the write transaction
+        result, result_digest = task.result, None
+        if self.blobs.should_store(result):
+            result, result_digest = None, self.blobs.put(result)
+        
+        conn = self._connect()
+        with conn:
+            # Fenced on the claim: a worker whose lease expired and whose task
+            # was claimed again must not overwrite the new claim
+            cursor = conn.execute("""
+                UPDATE tasks 
+                SET status = ?, completed_at = ?, result = ?, result_digest = ?, error = ?,
+                    run_after = ?, lease_expires = NULL
+                WHERE id = ? AND status = 'processing' AND attempts = ?
+            """, (
+                task.status,
+                task.completed_at,
+                result,
+                result_digest,
+                task.error,
+                task.run_after,
+                task.id,
+                task.attempts
+            ))
+            if cursor.rowcount:
+                self._record_metrics(conn, task)
+        return cursor.rowcount > 0
+    
+    def heartbeat(self, task_ids: Iterable[str]) -> int:
+        """Renew the leases of running tasks, returns how many were renewed"""
+        task_ids = list(task_ids)
+        if not task_ids:
+            return 0
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(f"""
+                UPDATE tasks SET lease_expires = ?
+                WHERE status = 'processing' AND id IN ({', '.join('?' for _ in task_ids)})
+            """, [time.time() + self.lease_seconds, *task_ids])
+        return cursor.rowcount
+    
+    def sweep_expired(self) -> List[Tuple[str, str]]:
+        """Requeue or dead-letter tasks whose lease expired, returns (id, new status)"""
+        conn = self._connect()
+        with conn:
+            rows = conn.execute("""
+                UPDATE tasks SET 
+                    status = CASE WHEN attempts >= :max_attempts THEN 'dead' ELSE 'pending' END,
+                    error = CASE WHEN attempts >= :max_attempts 
+                        THEN 'Lease expired after ' || attempts || ' attempts' ELSE error END,
+                    completed_at = CASE WHEN attempts >= :max_attempts THEN :now_iso ELSE completed_at END,
+                    lease_expires = NULL
+                WHERE status = 'processing' AND lease_expires < :now
+                RETURNING id, status
+            """, {
+                "max_attempts": self.max_attempts,
+                "now": time.time(),
+                "now_iso": datetime.now().isoformat()
+            }).fetchall()
+        if any(row['status'] == 'pending' for row in rows):
+            self.notifier.notify()
+        return [(row['id'], row['status']) for row in rows]
+    
+    def next_due(self) -> Optional[float]:
+        """Epoch seconds when the earliest scheduled task becomes due"""
+        return self._connect().execute(
+            "SELECT MIN(run_after) FROM tasks WHERE status = 'scheduled'"
+        ).fetchone()[0]
+    
+    def listen(self, callback) -> LocalListener:
+        """Call callback when a process on this host queues tasks in this database"""
+        return self.notifier.listen(callback)
+    
+    def compact(self, retention_days: float, batch_size: int = 500, vacuum_pages: int = 1000) -> int:
+        """Archive tasks that finished more than retention_days ago, returns the count
+        
+        Tasks go to <archive_dir>/<YYYY-MM>.db by completion month, batch_size
+        rows per transaction so claims are never held up for long. Freed pages
+        are then returned vacuum_pages at a time.
+        """
+        cutoff = (datetime.now() - timedelta(days=retention_days)).isoformat()
+        conn = self._connect()
+        archived = 0
+        for status in FINISHED_STATUSES:
+            while True:
+                # A task finished before the cutoff was also created before it,
+                # which lets idx_status_created find the rows. Tasks stored
+                # before failures were stamped have no completed_at and age
+                # by created_at instead.
+                rows = conn.execute("""
+                    SELECT id, substr(COALESCE(completed_at, created_at), 1, 7) AS month FROM tasks 
+                    WHERE status = ? AND created_at < ? AND COALESCE(completed_at, created_at) < ?
+                    ORDER BY created_at, id 
+                    LIMIT ?
+                """, (status, cutoff, cutoff, batch_size)).fetchall()
+                months: Dict[str, List[str]] = {}
+                for row in rows:
+                    months.setdefault(row['month'], []).append(row['id'])
+                for month, task_ids in months.items():
+                    self._archive(conn, month, task_ids)
+                archived += len(rows)
+                if len(rows) < batch_size:
+                    break
+        
+        self._incremental_vacuum(conn, vacuum_pages)
+        return archived
+    
+    def _archive(self, conn: sqlite3.Connection, month: str, task_ids: List[str]):
+        """Move task_ids into the archive database for month"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        conn.execute("ATTACH DATABASE ? AS archive", (os.path.join(self.archive_dir, f"{month}.db"),))
+        try:
+            columns = conn.execute("PRAGMA main.table_info(tasks)").fetchall()
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS archive.tasks (
+                    {', '.join(f"{c['name']} {c['type']}{' PRIMARY KEY' if c['pk'] else ''}" for c in columns)}
+                )
+            """)
+            # Archives written by older versions lack newer columns
+            existing = {row[1] for row in conn.execute("PRAGMA archive.table_info(tasks)")}
+            for column in columns:
+                if column['name'] not in existing:
+                    conn.execute(f"ALTER TABLE archive.tasks ADD COLUMN {column['name']} {column['type']}")
+            
+            names = ', '.join(column['name'] for column in columns)
+            ids = json.dumps(task_ids)
+            with conn:
+                # WAL makes the move atomic per database only, so a crash in
+                # between may leave a copy in both; REPLACE makes the retry safe
+                conn.execute(f"""
+                    INSERT OR REPLACE INTO archive.tasks ({names}) 
+                    SELECT {names} FROM main.tasks WHERE id IN (SELECT value FROM json_each(?))
+                """, (ids,))
+                conn.execute("DELETE FROM main.tasks WHERE id IN (SELECT value FROM json_each(?))", (ids,))
+        finally:
+            conn.execute("DETACH DATABASE archive")
+    
+    def _incremental_vacuum(self, conn: sqlite3.Connection, pages: int):
+        """Return free pages to the filesystem in short steps"""
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return
+        while conn.execute("PRAGMA freelist_count").fetchone()[0]:
+            conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+    
+    def enable_incremental_vacuum(self) -> bool:
+        """Switch a database created without auto_vacuum over, True if it had to
+        
+        This needs one full VACUUM, which locks the database while it rewrites it.
+        """
+        conn = self._connect()
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return False
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        return True
+    
+    def _record_metrics(self, conn: sqlite3.Connection, task: Task):
+        """Store stage timings and token usage in the side tables"""
+        if task.timings:
+            conn.executemany("""
+                INSERT OR REPLACE INTO task_timings (task_id, task_type, stage, duration_ms)
+                VALUES (?, ?, ?, ?)
+            """, [(task.id, task.task_type, stage, ms) for stage, ms in task.timings.items()])
+        if task.usage:
+            conn.execute("""
+                INSERT OR REPLACE INTO task_usage 
+                (task_id, task_type, input_tokens, output_tokens, 
+                 cache_creation_input_tokens, cache_read_input_tokens, output_sample)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (
+                task.id,
+                task.task_type,
+                task.usage.get('input_tokens', 0),
+                task.usage.get('output_tokens', 0),
+                task.usage.get('cache_creation_input_tokens', 0),
+                task.usage.get('cache_read_input_tokens', 0),
+                task.output_sample or 0
+            ))
+    
+    def get_stage_samples(self) -> Dict[Tuple[str, str], List[float]]:
+        """Get recorded stage durations grouped by (task_type, stage)"""
+        samples: Dict[Tuple[str, str], List[float]] = {}
+        cursor = self._connect().execute(
+            "SELECT task_type, stage, duration_ms FROM task_timings ORDER BY task_type, stage"
+        )
+        for task_type, stage, duration_ms in cursor:
+            samples.setdefault((task_type, stage), []).append(duration_ms)
+        return samples
+    
+    def get_output_samples(self, limit: int = 500) -> Dict[str, List[int]]:
+        """Get the most recent output token counts per task type
+        
+        Each task contributes its longest complete response (0 if none, e.g.
+        truncated); rows from before output_sample existed use their total.
+        """
+        samples: Dict[str, List[int]] = {}
+        cursor = self._connect().execute("""
+            SELECT task_type, sample FROM (
+                SELECT task_type, COALESCE(output_sample, output_tokens) AS sample, ROW_NUMBER() OVER (
+                    PARTITION BY task_type ORDER BY rowid DESC
+                ) AS n
+                FROM task_usage
+                WHERE COALESCE(output_sample, output_tokens) > 0
+            ) WHERE n <= ?
+        """, (limit,))
+        for task_type, output_tokens in cursor:
+            samples.setdefault(task_type, []).append(output_tokens)
+        return samples
+    
+    def get_wait_samples(self) -> Dict[int, List[float]]:
+        """Get recorded queue wait durations grouped by priority"""
+        samples: Dict[int, List[float]] = {}
+        cursor = self._connect().execute("""
+            SELECT tasks.priority, task_timings.duration_ms 
+            FROM task_timings JOIN tasks ON tasks.id = task_timings.task_id
+            WHERE task_timings.stage = 'queue_wait'
+        """)
+        for priority, duration_ms in cursor:
+            samples.setdefault(priority, []).append(duration_ms)
+        return samples
+    
+    def get_usage_totals(self) -> Dict[str, Dict[str, int]]:
+        """Get token usage totals per task type"""
+        cursor = self._connect().execute("""
+            SELECT task_type, COUNT(*), SUM(input_tokens), SUM(output_tokens),
+                   SUM(cache_creation_input_tokens), SUM(cache_read_input_tokens)
+            FROM task_usage GROUP BY task_type
+        """)
+        return {
+            row[0]: dict(zip(USAGE_COLUMNS, row[1:]))
+            for row in cursor
+        }
     
     def get_task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
         """Get task status by ID"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,))
-            row = cursor.fetchone()
-            
-            if row:
-                return {
-                    'id': row['id'],
-                    'description': row['description'],
-                    'status': row['status'],
-                    'created_at': row['created_at'],
-                    'completed_at': row['completed_at'],
-                    'error': row['error']
-                }
+        row = self._connect().execute("""
+            SELECT id, description, status, created_at, completed_at, error
+            FROM tasks WHERE id = ?
+        """, (task_id,)).fetchone()
+        
+        if row:
+            return {
+                'id': row['id'],
+                'description': row['description'],
+                'status': row['status'],
+                'created_at': row['created_at'],
+                'completed_at': row['completed_at'],
+                'error': row['error']
+            }
         return None
     
-    def list_tasks(self, status: Optional[str] = None) -> List[Task]:
-        """List all tasks, optionally filtered by status"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            
-            if status:
-                cursor = conn.execute(
-                    "SELECT * FROM tasks WHERE status = ? ORDER BY created_at DESC",
-                    (status,)
-                )
-            else:
-                cursor = conn.execute("SELECT * FROM tasks ORDER BY created_at DESC")
+    def get_result(self, task_id: str) -> Optional[str]:
+        """Get a task's result, reading it from the blob store if offloaded"""
+        row = self._connect().execute(
+            "SELECT result, result_digest FROM tasks WHERE id = ?", (task_id,)
+        ).fetchone()
+        if not row:
+            return None
+        if row['result_digest']:
+            return self.blobs.read(row['result_digest'])
+        return row['result']
+    
+    def iter_result(self, task_id: str) -> Optional[Iterator[str]]:
+        """A task's result in pieces, streamed from the blob store if offloaded"""
+        row = self._connect().execute(
+            "SELECT result, result_digest FROM tasks WHERE id = ?", (task_id,)
+        ).fetchone()
+        if not row:
+            return None
+        if row['result_digest']:
+            return self.blobs.iter_text(row['result_digest'])
+        return None if row['result'] is None else iter([row['result']])
+    
+    def list_tasks(self, status: Optional[str] = None, page_size: int = 500,
+                   columns: Optional[Iterable[str]] = None) -> Iterator[Task]:
+        """Yield tasks newest first, optionally filtered by status
+        
+        Pages are fetched by keyset on (created_at, id), so memory stays
+        flat and each page is an index range scan. columns picks from
+        OPTIONAL_COLUMNS (default leaves result out).
+        """
+        columns = [name for name in (columns or DEFAULT_LIST_COLUMNS) if name in OPTIONAL_COLUMNS]
+        if "result" in columns:
+            columns.append("result_digest")
+        select = ", ".join(LIST_COLUMNS + tuple(columns))
+        where = ["status = ?"] if status else []
+        params: List[Any] = [status] if status else []
+        conn = self._connect()
+        
+        cursor = None
+        while True:
+            keyset = ["(created_at, id) < (?, ?)"] if cursor else []
+            clause = " AND ".join(where + keyset)
+            rows = conn.execute(f"""
+                SELECT {select} FROM tasks 
+                {"WHERE " + clause if clause else ""}
+                ORDER BY created_at DESC, id DESC 
+                LIMIT ?
+            """, params + list(cursor or ()) + [page_size]).fetchall()
             
-            tasks = []
-            for row in cursor.fetchall():
-                tasks.append(Task(
-                    id=row['id'],
-                    description=row['description'],
-                    task_type=row['task_type'],
-                    parameters=json.loads(row['parameters']),
-                    status=row['status'],
-                    created_at=row['created_at'],
-                    completed_at=row['completed_at'],
-                    result=row['result'],
-                    error=row['error']
-                ))
-            return tasks
+            for row in rows:
+                yield self._row_to_task(row)
+            if len(rows) < page_size:
+                return
+            cursor = (rows[-1]['created_at'], rows[-1]['id'])
+    
+    def count_tasks(self, status: Optional[str] = None) -> int:
+        """Count tasks from the index alone"""
+        if status:
+            row = self._connect().execute(
+                "SELECT COUNT(*) FROM tasks WHERE status = ?", (status,)
+            ).fetchone()
+        else:
+            row = self._connect().execute("SELECT COUNT(*) FROM tasks").fetchone()
+        return row[0]
 
 class RedisBackend(QueueBackend):
-    """Redis backend for distributed task queue"""
+    """Redis backend for distributed task queue
     
-    def __init__(self, redis_url: str = "redis://localhost:6379/0"):
+    Pending task IDs are kept in one list per priority level and task type
+    (pending_tasks:<priority>:<task_type>), newest at the head. The set
+    pending_lists names every such list.
+    
+    For listing, every task is indexed in the tasks:created sorted set and
+    in one tasks:status:<status> sorted set, both scored by creation time.
+    
+    Claimed tasks hold a lease in the leases sorted set, scored by expiry,
+    and tasks due later wait in scheduled_tasks, scored by run_after.
+    """
+    
+    # Removes a lease only if it is still expired, so a heartbeat that lands
+    # between the sweeper's read and its removal keeps the task
+    _EXPIRE_LEASE = """
+        local expires = redis.call('ZSCORE', KEYS[1], ARGV[1])
+        if expires and tonumber(expires) <= tonumber(ARGV[2]) then
+            return redis.call('ZREM', KEYS[1], ARGV[1])
+        end
+        return 0
+    """
+    
+    # Moves a task from its pending list to processing_tasks and gives it a
+    # lease in one step, so a consumer that dies mid-claim cannot leave a
+    # task that is neither pending nor swept. Returns the new attempt count,
+    # or nil if another consumer got there first or the task is gone.
+    _CLAIM_TASK = """
+        if redis.call('LREM', KEYS[1], -1, ARGV[1]) == 0 then
+            return false
+        end
+        if redis.call('EXISTS', KEYS[4]) == 0 then
+            return false
+        end
+        redis.call('LPUSH', KEYS[2], ARGV[1])
+        redis.call('ZADD', KEYS[3], ARGV[2], ARGV[1])
+        redis.call('HSET', KEYS[4], 'status', 'processing')
+        return redis.call('HINCRBY', KEYS[4], 'attempts', 1)
+    """
+    
+    # Writes a claimed task's outcome only if the claim is still current
+    # (processing, same attempt count), then drops its lease and moves it
+    # off processing_tasks; a retried task joins scheduled_tasks in the same
+    # step. Returns 0 for a stale claim.
+    _STORE_RESULT = """
+        if redis.call('HGET', KEYS[1], 'status') ~= 'processing'
+            or redis.call('HGET', KEYS[1], 'attempts') ~= ARGV[2] then
+            return 0
+        end
+        redis.call('HSET', KEYS[1], unpack(ARGV, 4))
+        redis.call('ZREM', KEYS[2], ARGV[1])
+        redis.call('LREM', KEYS[3], 0, ARGV[1])
+        if ARGV[3] ~= '' then
+            redis.call('ZADD', KEYS[4], ARGV[3], ARGV[1])
+        end
+        return 1
+    """
+    
+    def __init__(self, redis_url: str = "redis://localhost:6379/0",
+                 scheduler: Optional[Scheduler] = None, lease_seconds: float = 120,
+                 max_attempts: int = 3):
+        self.scheduler = scheduler or Scheduler()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
         try:
             import redis
             self.redis = redis.from_url(redis_url)
@@ -201,47 +1078,187 @@ class RedisBackend(QueueBackend):
         except Exception as e:
             raise ConnectionError(f"Cannot connect to Redis: {e}")
     
-    def add_task(self, task: Task) -> str:
-        """Add task to Redis queue"""
-        task_data = {
+    def _task_mapping(self, task: Task) -> Dict[str, Any]:
+        return {
             'id': task.id,
             'description': task.description,
             'task_type': task.task_type,
-            'parameters': task.parameters,
+            'parameters': json.dumps(task.parameters),
             'status': task.status,
-            'created_at': task.created_at
+            'created_at': task.created_at,
+            'priority': task.priority,
+            'run_after': task.run_after if task.run_after is not None else ''
         }
-        
+    
+    def _pending_key(self, task: Task) -> str:
+        return f"pending_tasks:{task.priority}:{task.task_type}"
+    
+    def _enqueue(self, pipe, task: Task):
+        """Queue commands that make a task claimable, now or at run_after"""
+        if task.status == "scheduled":
+            pipe.zadd("scheduled_tasks", {task.id: task.run_after})
+        else:
+            pipe.lpush(self._pending_key(task), task.id)
+            pipe.sadd("pending_lists", self._pending_key(task))
+    
+    def _created_score(self, created_at: str) -> float:
+        try:
+            return datetime.fromisoformat(created_at).timestamp()
+        except (TypeError, ValueError):
+            return 0.0
+    
+    def _index(self, pipe, task_id: str, status: str, score: float):
+        """Queue commands that move a task into its status index"""
+        pipe.zadd("tasks:created", {task_id: score})
+        for other in TASK_STATUSES:
+            if other != status:
+                pipe.zrem(f"tasks:status:{other}", task_id)
+        pipe.zadd(f"tasks:status:{status}", {task_id: score})
+    
+    def _task_from_hash(self, task_data: Dict[bytes, bytes]) -> Task:
+        return Task(
+            id=task_data[b'id'].decode('utf-8'),
+            description=task_data[b'description'].decode('utf-8'),
+            task_type=task_data[b'task_type'].decode('utf-8'),
+            parameters=json.loads(task_data[b'parameters'].decode('utf-8')),
+            status=task_data[b'status'].decode('utf-8'),
+            created_at=task_data[b'created_at'].decode('utf-8'),
+            completed_at=task_data.get(b'completed_at', b'').decode('utf-8'),
+            result=task_data.get(b'result', b'').decode('utf-8'),
+            error=task_data.get(b'error', b'').decode('utf-8'),
+            priority=int(task_data.get(b'priority', DEFAULT_PRIORITY)),
+            attempts=int(task_data.get(b'attempts', 0)),
+            run_after=float(task_data[b'run_after']) if task_data.get(b'run_after') else None
+        )
+    
+    def add_task(self, task: Task) -> str:
+        """Add task to Redis queue"""
         # Store task data
-        self.redis.hset(f"task:{task.id}", mapping=task_data)
+        self.redis.hset(f"task:{task.id}", mapping=self._task_mapping(task))
         
-        # Add to pending queue
-        self.redis.lpush("pending_tasks", task.id)
+        # Add to its priority and type's pending queue, or the schedule
+        pipe = self.redis.pipeline(transaction=False)
+        self._enqueue(pipe, task)
+        self._index(pipe, task.id, task.status, self._created_score(task.created_at))
+        pipe.publish("task_events", "queued")
+        pipe.execute()
         
         return task.id
     
+    def add_tasks(self, tasks: Iterable[Task], chunk_size: int = 1000) -> List[str]:
+        """Add many tasks through pipelines of chunk_size tasks"""
+        task_ids = []
+        pipe = self.redis.pipeline(transaction=False)
+        for task in tasks:
+            pipe.hset(f"task:{task.id}", mapping=self._task_mapping(task))
+            self._enqueue(pipe, task)
+            self._index(pipe, task.id, task.status, self._created_score(task.created_at))
+            task_ids.append(task.id)
+            if len(task_ids) % chunk_size == 0:
+                pipe.publish("task_events", "queued")
+                pipe.execute()
+        if len(task_ids) % chunk_size:
+            pipe.publish("task_events", "queued")
+        pipe.execute()
+        return task_ids
+    
     def get_next_task(self) -> Optional[Task]:
         """Get next task from Redis queue"""
-        # Move task from pending to processing
-        task_id = self.redis.brpoplpush("pending_tasks", "processing_tasks", timeout=1)
+        tasks = self.claim_batch(1)
+        return tasks[0] if tasks else None
+    
+    def claim_batch(self, limit: int, task_types: Optional[List[str]] = None) -> List[Task]:
+        """Claim up to limit pending tasks, optionally of the given types"""
+        if limit <= 0:
+            return []
         
-        if task_id:
-            task_id = task_id.decode('utf-8')
-            task_data = self.redis.hgetall(f"task:{task_id}")
+        self._promote_due()
+        keys = []
+        for key in self.redis.smembers("pending_lists"):
+            key = key.decode('utf-8')
+            _, priority, task_type = key.split(":", 2)
+            if not task_types or task_type in task_types:
+                keys.append((key, int(priority)))
+        if not task_types:
+            # List used before priorities were stored
+            keys.append(("pending_tasks", DEFAULT_PRIORITY))
+        
+        # Oldest tasks sit at the tail of each pending list
+        pipe = self.redis.pipeline(transaction=False)
+        for key, _ in keys:
+            pipe.lrange(key, -limit, -1)
+        
+        source = {}
+        for (key, priority), task_ids in zip(keys, pipe.execute()):
+            for task_id in task_ids:
+                source[task_id.decode('utf-8')] = (key, priority)
+        if not source:
+            return []
+        
+        pipe = self.redis.pipeline(transaction=False)
+        for task_id in source:
+            pipe.hmget(f"task:{task_id}", "task_type", "created_at", "run_after")
+        
+        candidates = []
+        for task_id, (task_type, created_at, run_after) in zip(source, pipe.execute()):
+            if task_type is not None:
+                candidates.append((task_id, task_type.decode('utf-8'), source[task_id][1],
+                                   created_at.decode('utf-8'), float(run_after) if run_after else None))
+        
+        # The claim script's LREM is atomic, so only one consumer can claim
+        # a given task. The oldest IDs sit at the tail, so it searches from there.
+        task_ids = self.scheduler.select(candidates, limit)
+        claim_task = self.redis.register_script(self._CLAIM_TASK)
+        expires = time.time() + self.lease_seconds
+        pipe = self.redis.pipeline(transaction=False)
+        for task_id in task_ids:
+            claim_task(keys=[source[task_id][0], "processing_tasks", "leases", f"task:{task_id}"],
+                       args=[task_id, expires], client=pipe)
+        won = [(task_id, attempts) for task_id, attempts in zip(task_ids, pipe.execute())
+               if attempts is not None]
+        
+        claimed = self._load_claimed(won)
+        self.scheduler.charge(claimed)
+        return claimed
+    
+    def _promote_due(self, batch_size: int = 1000):
+        """Move scheduled tasks whose run_after has passed to their pending list"""
+        for task_id in self.redis.zrangebyscore("scheduled_tasks", "-inf", time.time(),
+                                                start=0, num=batch_size):
+            # ZREM is atomic, so only one consumer promotes a given task
+            if not self.redis.zrem("scheduled_tasks", task_id):
+                continue
+            task_data = self.redis.hgetall(f"task:{task_id.decode('utf-8')}")
+            if not task_data:
+                continue
             
-            if task_data:
-                # Mark as processing
-                self.redis.hset(f"task:{task_id}", "status", "processing")
-                
-                return Task(
-                    id=task_data[b'id'].decode('utf-8'),
-                    description=task_data[b'description'].decode('utf-8'),
-                    task_type=task_data[b'task_type'].decode('utf-8'),
-                    parameters=json.loads(task_data[b'parameters'].decode('utf-8')),
-                    status='processing',
-                    created_at=task_data[b'created_at'].decode('utf-8')
-                )
-        return None
+            task = self._task_from_hash(task_data)
+            task.status = "pending"
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hset(f"task:{task.id}", "status", "pending")
+            self._enqueue(pipe, task)
+            self._index(pipe, task.id, task.status, self._created_score(task.created_at))
+            pipe.execute()
+    
+    def _load_claimed(self, won: List[Tuple[str, int]]) -> List[Task]:
+        """Load tasks claimed by the claim script and move them to the processing index"""
+        if not won:
+            return []
+        pipe = self.redis.pipeline(transaction=False)
+        for task_id, _ in won:
+            pipe.hgetall(f"task:{task_id}")
+        
+        claimed = []
+        pipe_index = self.redis.pipeline(transaction=False)
+        for (task_id, attempts), task_data in zip(won, pipe.execute()):
+            if not task_data:
+                continue
+            task = self._task_from_hash(task_data)
+            task.attempts = int(attempts)
+            self._index(pipe_index, task_id, "processing", self._created_score(task.created_at))
+            claimed.append(task)
+        pipe_index.execute()
+        return claimed
     
     def update_task_status(self, task: Task) -> bool:
         """Update task status in Redis"""
@@ -249,18 +1266,142 @@ class RedisBackend(QueueBackend):
             'status': task.status,
             'completed_at': task.completed_at or '',
             'result': task.result or '',
-            'error': task.error or ''
+            'error': task.error or '',
+            'run_after': task.run_after if task.run_after is not None else ''
         }
         
-        # Update task data
-        self.redis.hset(f"task:{task.id}", mapping=updates)
-        
-        # Remove from processing queue if completed/failed
-        if task.status in ['completed', 'failed']:
-            self.redis.lrem("processing_tasks", 0, task.id)
+        store_result = self.redis.register_script(self._STORE_RESULT)
+        fields = [item for pair in updates.items() for item in pair]
+        if not store_result(keys=[f"task:{task.id}", "leases", "processing_tasks", "scheduled_tasks"],
+                            args=[task.id, task.attempts,
+                                  task.run_after if task.status == "scheduled" else '', *fields]):
+            return False
         
+        # Move the task to its status index
+        score = self.redis.zscore("tasks:created", task.id)
+        pipe = self.redis.pipeline(transaction=False)
+        self._index(pipe, task.id, task.status,
+                    score if score is not None else self._created_score(task.created_at))
+        pipe.execute()
+        self._record_metrics(task)
         return True
     
+    def heartbeat(self, task_ids: Iterable[str]) -> int:
+        """Renew the leases of running tasks, returns how many were renewed"""
+        expires = time.time() + self.lease_seconds
+        pipe = self.redis.pipeline(transaction=False)
+        for task_id in task_ids:
+            # XX only renews leases that still exist, CH counts them
+            pipe.zadd("leases", {task_id: expires}, xx=True, ch=True)
+        return sum(pipe.execute())
+    
+    def sweep_expired(self, batch_size: int = 1000) -> List[Tuple[str, str]]:
+        """Requeue or dead-letter tasks whose lease expired, returns (id, new status)"""
+        now = time.time()
+        expire_lease = self.redis.register_script(self._EXPIRE_LEASE)
+        swept = []
+        for task_id in self.redis.zrangebyscore("leases", "-inf", now, start=0, num=batch_size):
+            # Only the sweeper that removes the lease handles the task
+            if not expire_lease(keys=["leases"], args=[task_id, now]):
+                continue
+            task_id = task_id.decode('utf-8')
+            task_data = self.redis.hgetall(f"task:{task_id}")
+            if not task_data:
+                continue
+            
+            task = self._task_from_hash(task_data)
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.lrem("processing_tasks", 0, task_id)
+            if task.attempts >= self.max_attempts:
+                task.status = "dead"
+                pipe.hset(f"task:{task_id}", mapping={
+                    'status': "dead",
+                    'error': f"Lease expired after {task.attempts} attempts",
+                    'completed_at': datetime.now().isoformat()
+                })
+            else:
+                task.status = "pending"
+                pipe.hset(f"task:{task_id}", "status", "pending")
+                self._enqueue(pipe, task)
+            self._index(pipe, task_id, task.status, self._created_score(task.created_at))
+            if task.status == "pending":
+                pipe.publish("task_events", "queued")
+            pipe.execute()
+            swept.append((task_id, task.status))
+        return swept
+    
+    def next_due(self) -> Optional[float]:
+        """Epoch seconds when the earliest scheduled task becomes due"""
+        first = self.redis.zrange("scheduled_tasks", 0, 0, withscores=True)
+        return first[0][1] if first else None
+    
+    def listen(self, callback):
+        """Call callback on every task_events message, from a pub/sub thread"""
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(task_events=lambda message: callback())
+        # get_message blocks up to sleep_time per loop, so an idle thread barely wakes
+        return pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+    
+    def _record_metrics(self, task: Task):
+        """Keep capped per-stage sample lists and per-type usage counters"""
+        pipe = self.redis.pipeline()
+        for stage, ms in task.timings.items():
+            key = f"timings:{task.task_type}:{stage}"
+            pipe.lpush(key, ms)
+            pipe.ltrim(key, 0, MAX_STAGE_SAMPLES - 1)
+            pipe.sadd("timing_keys", key)
+        if "queue_wait" in task.timings:
+            pipe.lpush(f"queue_wait:{task.priority}", task.timings["queue_wait"])
+            pipe.ltrim(f"queue_wait:{task.priority}", 0, MAX_STAGE_SAMPLES - 1)
+        if task.output_sample:
+            # Longest complete response only, so truncated or split output
+            # does not skew max_tokens sizing
+            pipe.lpush(f"output_tokens:{task.task_type}", task.output_sample)
+            pipe.ltrim(f"output_tokens:{task.task_type}", 0, MAX_STAGE_SAMPLES - 1)
+        if task.usage:
+            pipe.hincrby(f"usage:{task.task_type}", "tasks", 1)
+            for name, value in task.usage.items():
+                pipe.hincrby(f"usage:{task.task_type}", name, value)
+            pipe.sadd("usage_types", task.task_type)
+        pipe.execute()
+    
+    def get_stage_samples(self) -> Dict[Tuple[str, str], List[float]]:
+        """Get recorded stage durations grouped by (task_type, stage)"""
+        samples = {}
+        for key in self.redis.smembers("timing_keys"):
+            _, task_type, stage = key.decode('utf-8').split(":", 2)
+            samples[(task_type, stage)] = [float(v) for v in self.redis.lrange(key, 0, -1)]
+        return samples
+    
+    def get_output_samples(self, limit: int = 500) -> Dict[str, List[int]]:
+        """Get the most recent output token counts per task type"""
+        samples = {}
+        for task_type in self.redis.smembers("usage_types"):
+            task_type = task_type.decode('utf-8')
+            values = self.redis.lrange(f"output_tokens:{task_type}", 0, limit - 1)
+            samples[task_type] = [int(v) for v in values]
+        return samples
+    
+    def get_wait_samples(self) -> Dict[int, List[float]]:
+        """Get recorded queue wait durations grouped by priority"""
+        pipe = self.redis.pipeline(transaction=False)
+        for level in PRIORITY_LEVELS:
+            pipe.lrange(f"queue_wait:{level}", 0, -1)
+        return {
+            level: [float(v) for v in values]
+            for level, values in zip(PRIORITY_LEVELS, pipe.execute())
+            if values
+        }
+    
+    def get_usage_totals(self) -> Dict[str, Dict[str, int]]:
+        """Get token usage totals per task type"""
+        totals = {}
+        for task_type in self.redis.smembers("usage_types"):
+            task_type = task_type.decode('utf-8')
+            data = self.redis.hgetall(f"usage:{task_type}")
+            totals[task_type] = {name: int(data.get(name.encode(), 0)) for name in USAGE_COLUMNS}
+        return totals
+    
     def get_task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
         """Get task status from Redis"""
         task_data = self.redis.hgetall(f"task:{task_id}")
@@ -276,38 +1417,101 @@ class RedisBackend(QueueBackend):
             }
         return None
     
-    def list_tasks(self, status: Optional[str] = None) -> List[Task]:
-        """List tasks from Redis - basic implementation"""
-        # This is a simplified implementation
-        # In production, you'd want better indexing
-        task_keys = self.redis.keys("task:*")
-        tasks = []
-        
-        for key in task_keys:
-            task_data = self.redis.hgetall(key)
-            if task_data:
-                task_status = task_data[b'status'].decode('utf-8')
-                if status and task_status != status:
-                    continue
-                
-                tasks.append(Task(
-                    id=task_data[b'id'].decode('utf-8'),
-                    description=task_data[b'description'].decode('utf-8'),
-                    task_type=task_data[b'task_type'].decode('utf-8'),
-                    parameters=json.loads(task_data[b'parameters'].decode('utf-8')),
-                    status=task_status,
-                    created_at=task_data[b'created_at'].decode('utf-8'),
-                    completed_at=task_data.get(b'completed_at', b'').decode('utf-8'),
-                    result=task_data.get(b'result', b'').decode('utf-8'),
-                    error=task_data.get(b'error', b'').decode('utf-8')
-                ))
+    def get_result(self, task_id: str) -> Optional[str]:
+        """Get a task's result from Redis"""
+        result = self.redis.hget(f"task:{task_id}", "result")
+        return result.decode('utf-8') if result else None
+    
+    def list_tasks(self, status: Optional[str] = None, page_size: int = 500,
+                   columns: Optional[Iterable[str]] = None) -> Iterator[Task]:
+        """Yield tasks newest first, optionally filtered by status"""
+        for page in self.list_pages(status, page_size, columns):
+            yield from page
+    
+    def count_tasks(self, status: Optional[str] = None) -> int:
+        """Count tasks from the index alone"""
+        return self.redis.zcard(f"tasks:status:{status}" if status else "tasks:created")
+    
+    def list_pages(self, status: Optional[str] = None, page_size: int = 500,
+                   columns: Optional[Iterable[str]] = None) -> Iterator[List[Task]]:
+        """Yield pages of tasks newest first through the creation-time indexes
         
-        return sorted(tasks, key=lambda x: x.created_at, reverse=True)
+        Each page is one ZREVRANGEBYSCORE from a (score, IDs seen at that
+        score) cursor plus one pipeline of HMGETs, so the server is never
+        busy for longer than a page. columns picks from OPTIONAL_COLUMNS
+        (default leaves result out).
+        """
+        fields = LIST_COLUMNS + tuple(
+            name for name in (columns or DEFAULT_LIST_COLUMNS) if name in OPTIONAL_COLUMNS
+        )
+        key = f"tasks:status:{status}" if status else "tasks:created"
+        max_score: Any = "+inf"
+        seen_at_max: set = set()
+        while True:
+            entries = self.redis.zrevrangebyscore(
+                key, max_score, "-inf", start=0, num=page_size + len(seen_at_max), withscores=True
+            )
+            entries = [(task_id, score) for task_id, score in entries if task_id not in seen_at_max]
+            if not entries:
+                return
+            entries = entries[:page_size]
+            
+            pipe = self.redis.pipeline(transaction=False)
+            for task_id, _ in entries:
+                pipe.hmget(f"task:{task_id.decode('utf-8')}", *fields)
+            yield [
+                self._task_from_hash({
+                    name.encode(): value for name, value in zip(fields, values) if value is not None
+                })
+                for values in pipe.execute() if values[0] is not None
+            ]
+            
+            # Ties on the last score are skipped by ID on the next page
+            last_score = entries[-1][1]
+            if last_score != max_score:
+                seen_at_max = set()
+            max_score = last_score
+            seen_at_max.update(task_id for task_id, score in entries if score == last_score)
+    
+    def rebuild_indexes(self, batch_size: int = 1000) -> int:
+        """Index tasks stored before the listing indexes existed, using SCAN"""
+        indexed = 0
+        keys = []
+        for key in self.redis.scan_iter(match="task:*", count=batch_size):
+            keys.append(key)
+            if len(keys) >= batch_size:
+                indexed += self._index_keys(keys)
+                keys = []
+        if keys:
+            indexed += self._index_keys(keys)
+        return indexed
+    
+    def _index_keys(self, keys: List[bytes]) -> int:
+        pipe = self.redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.hmget(key, "id", "status", "created_at")
+        rows = [row for row in pipe.execute() if row[0] and row[1]]
+        
+        pipe = self.redis.pipeline(transaction=False)
+        for task_id, status, created_at in rows:
+            self._index(pipe, task_id.decode('utf-8'), status.decode('utf-8'),
+                        self._created_score((created_at or b'').decode('utf-8')))
+        pipe.execute()
+        return len(rows)
 
 class TaskQueue:
     """High-level task queue interface"""
     
-    def __init__(self, backend_type: str = "sqlite", **backend_kwargs):
+    def __init__(self, backend_type: str = "sqlite", scheduling: Optional[Dict[str, Any]] = None,
+                 leases: Optional[Dict[str, Any]] = None, retries: Optional[Dict[str, Any]] = None,
+                 **backend_kwargs):
+        retries = retries or {}
+        self.retry_base_delay = retries.get("base_delay", 10)
+        self.retry_max_delay = retries.get("max_delay", 600)
+        backend_kwargs.setdefault("scheduler", Scheduler(scheduling))
+        for name in ("lease_seconds", "max_attempts"):
+            if leases and name in leases:
+                backend_kwargs.setdefault(name, leases[name])
         if backend_type == "sqlite":
             self.backend = SQLiteBackend(**backend_kwargs)
         elif backend_type == "redis":
@@ -316,64 +1520,307 @@ class TaskQueue:
             raise ValueError(f"Unknown backend type: {backend_type}")
     
     def submit_task(self, description: str, task_type: str = "general", 
-                   priority: int = 5, **parameters) -> str:
-        """Submit a new task to the queue"""
-        task = Task(
+                   priority: int = DEFAULT_PRIORITY,
+                   run_at: Union[datetime, float, str, None] = None, **parameters) -> str:
+        """Submit a new task to the queue (priority 0 is most urgent, 9 least)
+        
+        run_at (datetime, ISO string or epoch seconds) holds the task back
+        until that time.
+        """
+        task = self._build_task(description, task_type, priority, parameters, run_at=run_at)
+        return self.backend.add_task(task)
+    
+    def _build_task(self, description: str, task_type: str = "general", priority: int = DEFAULT_PRIORITY,
+                    parameters: Optional[Dict[str, Any]] = None, type: Optional[str] = None,
+                    run_at: Union[datetime, float, str, None] = None) -> Task:
+        run_after = to_epoch(run_at)
+        return Task(
             id=self._generate_task_id(description),
             description=description,
-            task_type=task_type,
-            parameters=parameters,
-            created_at=datetime.now().isoformat()
+            task_type=type or task_type,
+            parameters=parameters or {},
+            status="scheduled" if run_after and run_after > time.time() else "pending",
+            created_at=datetime.now().isoformat(),
+            priority=clamp_priority(priority),
+            run_after=run_after
         )
-        
-        return self.backend.add_task(task)
     
     def get_next_task(self) -> Optional[Task]:
         """Get the next task to process"""
         return self.backend.get_next_task()
     
+    def submit_many(self, tasks: Iterable[Dict[str, Any]]) -> List[str]:
+        """Submit many tasks at once
+        
+        Each item is a dict with description and optional task_type (or
+        type), priority, run_at and parameters. SQLite inserts them in one
+        transaction; Redis pipelines them.
+        """
+        return self.backend.add_tasks(self._build_task(**item) for item in tasks)
+    
+    def claim_batch(self, n: int, task_types: Optional[List[str]] = None) -> List[Task]:
+        """Atomically claim up to n pending tasks"""
+        return self.backend.claim_batch(n, task_types)
+    
     def update_task_status(self, task: Task) -> bool:
-        """Update task status and results"""
+        """Update task status and results
+        
+        Finished tasks are stamped with completed_at if the caller left it
+        unset (failures usually do), so compaction can age them out. Returns
+        False without writing if the task's claim is stale: its lease ran
+        out and it was requeued or claimed again since.
+        """
+        if task.status in FINISHED_STATUSES and not task.completed_at:
+            task.completed_at = datetime.now().isoformat()
+        return self.backend.update_task_status(task)
+    
+    def can_retry(self, task: Task) -> bool:
+        """Whether a failed task has attempts left"""
+        return task.attempts < self.backend.max_attempts
+    
+    def retry_later(self, task: Task) -> bool:
+        """Reschedule a failed task with exponential backoff
+        
+        The delay doubles per attempt up to retry_max_delay, with full
+        jitter so tasks that failed together do not retry together. Returns
+        False, leaving the task alone, once max_attempts is used up or if
+        the claim is stale.
+        """
+        if not self.can_retry(task):
+            return False
+        delay = min(self.retry_base_delay * 2 ** max(task.attempts - 1, 0), self.retry_max_delay)
+        task.status = "scheduled"
+        task.run_after = time.time() + random.uniform(0, delay)
+        task.completed_at = None
         return self.backend.update_task_status(task)
     
+    def next_due(self) -> Optional[float]:
+        """Epoch seconds when the earliest scheduled task becomes due"""
+        return self.backend.next_due()
+    
+    def heartbeat(self, task_ids: Iterable[str]) -> int:
+        """Renew the leases of running tasks"""
+        return self.backend.heartbeat(task_ids)
+    
+    def sweep_expired(self) -> List[Tuple[str, str]]:
+        """Requeue or dead-letter tasks whose lease expired"""
+        return self.backend.sweep_expired()
+    
+    def watch(self, callback):
+        """Call callback whenever new tasks may be claimable; returns a handle with stop()
+        
+        SQLite notifies processes on the same host through UNIX sockets next
+        to the database; Redis uses pub/sub on task_events.
+        """
+        return self.backend.listen(callback)
+    
     def get_status(self, task_id: str) -> Optional[Dict[str, Any]]:
         """Get task status"""
         return self.backend.get_task_status(task_id)
     
-    def list_all_tasks(self, status: Optional[str] = None) -> List[Task]:
-        """List all tasks"""
-        return self.backend.list_tasks(status)
+    def get_result(self, task_id: str) -> Optional[str]:
+        """Get a task's result (loaded only when asked for)"""
+        return self.backend.get_result(task_id)
+    
+    def iter_result(self, task_id: str) -> Optional[Iterator[str]]:
+        """A task's result in pieces, so large blob results are never held whole"""
+        return self.backend.iter_result(task_id)
+    
+    def list_all_tasks(self, status: Optional[str] = None,
+                       columns: Optional[Iterable[str]] = None) -> Iterator[Task]:
+        """Iterate over all tasks, newest first (result only if in columns)"""
+        return self.backend.list_tasks(status, columns=columns)
+    
+    def count_tasks(self, status: Optional[str] = None) -> int:
+        """Count tasks, optionally by status"""
+        return self.backend.count_tasks(status)
+    
+    def get_output_samples(self, limit: int = 500) -> Dict[str, List[int]]:
+        """Get recent output token counts per task type"""
+        return self.backend.get_output_samples(limit)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get p50/p95/p99 stage timings and token usage per task type, and queue wait per priority"""
+        stages = {}
+        for (task_type, stage), values in self.backend.get_stage_samples().items():
+            values = sorted(values)
+            stages.setdefault(task_type, {})[stage] = {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99)
+            }
+        queue_wait = {}
+        for priority, values in self.backend.get_wait_samples().items():
+            values = sorted(values)
+            queue_wait[priority] = {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99)
+            }
+        return {"stages": stages, "usage": self.backend.get_usage_totals(), "queue_wait": queue_wait}
     
     def _generate_task_id(self, description: str) -> str:
         """Generate unique task ID"""
+        # The counter keeps IDs unique when bulk submits share a timestamp
         timestamp = str(time.time())
-        return hashlib.md5(f"{description}{timestamp}".encode()).hexdigest()[:8]
+        return hashlib.md5(
+            f"{description}{timestamp}{os.getpid()}{next(_task_counter)}".encode()
+        ).hexdigest()[:12]
+
+def _claim_worker(db_path: str) -> List[str]:
+    """Benchmark worker: claim tasks until the queue is empty"""
+    backend = SQLiteBackend(db_path)
+    claimed = []
+    while True:
+        task = backend.get_next_task()
+        if not task:
+            return claimed
+        claimed.append(task.id)
+
+def benchmark_claims(num_tasks: int = 5000, worker_counts: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    """Measure SQLite claims per second as the number of worker processes grows"""
+    import tempfile
+    from multiprocessing import Pool
+    
+    results = []
+    for workers in worker_counts or [1, 2, 4, 8]:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "bench.db")
+            backend = SQLiteBackend(db_path)
+            now = datetime.now().isoformat()
+            for i in range(num_tasks):
+                backend.add_task(Task(
+                    id=f"bench{i}", description="benchmark", task_type="general",
+                    parameters={}, created_at=now
+                ))
+            backend.close()
+            
+            with Pool(workers) as pool:
+                started = time.perf_counter()
+                claimed = pool.map(_claim_worker, [db_path] * workers)
+                elapsed = time.perf_counter() - started
+            
+            ids = [task_id for worker_ids in claimed for task_id in worker_ids]
+            results.append({
+                "workers": workers,
+                "claimed": len(ids),
+                "duplicates": len(ids) - len(set(ids)),
+                "seconds": round(elapsed, 3),
+                "claims_per_second": round(len(ids) / elapsed, 1) if elapsed else 0.0
+            })
+    return results
+
+# Keys a submitted task dict may carry, as accepted by TaskQueue.submit_many
+TASK_FIELDS = ("description", "task_type", "type", "priority", "parameters", "run_at")
+
+def read_jsonl_tasks(stream, default_type: str = "general") -> Iterator[Dict[str, Any]]:
+    """Yield task dicts from JSONL lines, skipping blank lines"""
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON on line {line_number}: {e}")
+        if not isinstance(item, dict):
+            raise ValueError(f"Expected a JSON object on line {line_number}")
+        if "description" not in item:
+            raise ValueError(f"Missing description on line {line_number}")
+        unknown = sorted(set(item) - set(TASK_FIELDS))
+        if unknown:
+            raise ValueError(f"Unknown key(s) {', '.join(unknown)} on line {line_number}; "
+                             f"task inputs go under parameters")
+        if "type" not in item and "task_type" not in item:
+            item["task_type"] = default_type
+        yield item
+
+def print_stats(stats: Dict[str, Any]):
+    """Print stage timing, queue wait and token usage tables"""
+    print(f"{'TASK TYPE':<20} {'STAGE':<20} {'COUNT':>7} {'P50 ms':>10} {'P95 ms':>10} {'P99 ms':>10}")
+    for task_type in sorted(stats["stages"]):
+        for stage, row in sorted(stats["stages"][task_type].items()):
+            print(f"{task_type:<20} {stage:<20} {row['count']:>7} "
+                  f"{row['p50']:>10.1f} {row['p95']:>10.1f} {row['p99']:>10.1f}")
+    
+    if stats["queue_wait"]:
+        print()
+        print(f"{'PRIORITY':<20} {'STAGE':<20} {'COUNT':>7} {'P50 ms':>10} {'P95 ms':>10} {'P99 ms':>10}")
+        for priority, row in sorted(stats["queue_wait"].items()):
+            print(f"{priority:<20} {'queue_wait':<20} {row['count']:>7} "
+                  f"{row['p50']:>10.1f} {row['p95']:>10.1f} {row['p99']:>10.1f}")
+    
+    if stats["usage"]:
+        print()
+        print(f"{'TASK TYPE':<20} {'TASKS':>7} {'INPUT':>10} {'OUTPUT':>10} {'CACHE W':>10} {'CACHE R':>10}")
+        for task_type, row in sorted(stats["usage"].items()):
+            print(f"{task_type:<20} {row['tasks']:>7} {row['input_tokens']:>10} {row['output_tokens']:>10} "
+                  f"{row['cache_creation_input_tokens']:>10} {row['cache_read_input_tokens']:>10}")
 
 # CLI for task queue management
-def main():
+def main(argv: Optional[List[str]] = None):
     import argparse
     
     parser = argparse.ArgumentParser(description="Mini-Claude Task Queue Manager")
     parser.add_argument("--backend", choices=["sqlite", "redis"], default="sqlite")
-    parser.add_argument("--submit", help="Submit a new task")
+    parser.add_argument("--submit", help="Submit a new task, or '-' to read JSONL tasks from stdin")
     parser.add_argument("--type", default="general", help="Task type")
+    parser.add_argument("--priority", type=int, default=DEFAULT_PRIORITY,
+                        help="Task priority, 0 (most urgent) to 9")
+    parser.add_argument("--delay", type=float, help="Run the submitted task after this many seconds")
     parser.add_argument("--list", action="store_true", help="List all tasks")
+    parser.add_argument("--count", action="store_true", help="Count tasks without listing them")
     parser.add_argument("--status", help="Filter by status")
     parser.add_argument("--get", help="Get task status by ID")
+    parser.add_argument("--result", help="Print the result of a task by ID")
+    parser.add_argument("--stats", action="store_true", help="Show per-stage timing percentiles")
+    parser.add_argument("--sweep", action="store_true",
+                        help="Requeue or dead-letter tasks whose lease expired")
+    parser.add_argument("--compact", action="store_true",
+                        help="Archive finished tasks older than --retention-days (SQLite)")
+    parser.add_argument("--retention-days", type=float, default=30,
+                        help="Age in days after which --compact archives finished tasks")
+    parser.add_argument("--reindex", action="store_true",
+                        help="Rebuild the Redis listing indexes for tasks stored before they existed")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Benchmark SQLite claims per second across worker processes")
+    parser.add_argument("--bench-tasks", type=int, default=5000, help="Tasks per benchmark run")
+    parser.add_argument("--bench-workers", default="1,2,4,8",
+                        help="Comma-separated worker process counts")
+    
+    args = parser.parse_args(argv)
     
-    args = parser.parse_args()
+    if args.benchmark:
+        workers = [int(n) for n in args.bench_workers.split(",")]
+        print(f"{'WORKERS':>8} {'CLAIMED':>8} {'DUPES':>6} {'SECONDS':>8} {'CLAIMS/S':>10}")
+        for row in benchmark_claims(args.bench_tasks, workers):
+            print(f"{row['workers']:>8} {row['claimed']:>8} {row['duplicates']:>6} "
+                  f"{row['seconds']:>8} {row['claims_per_second']:>10}")
+        return
     
     queue = TaskQueue(backend_type=args.backend)
     
-    if args.submit:
-        task_id = queue.submit_task(args.submit, args.type)
+    if args.submit == "-":
+        task_ids = queue.submit_many(read_jsonl_tasks(sys.stdin, args.type))
+        print(f"Submitted {len(task_ids)} tasks")
+    
+    elif args.submit:
+        run_at = time.time() + args.delay if args.delay else None
+        task_id = queue.submit_task(args.submit, args.type, args.priority, run_at)
         print(f"Task submitted: {task_id}")
     
     elif args.list:
-        tasks = queue.list_all_tasks(args.status)
-        print(f"Found {len(tasks)} tasks:")
-        for task in tasks:
+        # Print as pages arrive instead of loading the whole history first
+        count = 0
+        for task in queue.list_all_tasks(args.status):
             print(f"  {task.id}: {task.status} - {task.description}")
+            count += 1
+        print(f"Found {count} tasks")
+    
+    elif args.count:
+        print(queue.count_tasks(args.status))
     
     elif args.get:
         status = queue.get_status(args.get)
@@ -382,6 +1829,39 @@ def main():
         else:
             print(f"Task {args.get} not found")
     
+    elif args.result:
+        pieces = queue.iter_result(args.result)
+        if pieces is not None:
+            for piece in pieces:
+                sys.stdout.write(piece)
+            print()
+        else:
+            print(f"No result for task {args.result}")
+    
+    elif args.stats:
+        print_stats(queue.get_stats())
+    
+    elif args.sweep:
+        swept = queue.sweep_expired()
+        for task_id, status in swept:
+            print(f"  {task_id}: {status}")
+        print(f"Swept {len(swept)} expired leases")
+    
+    elif args.compact:
+        if not isinstance(queue.backend, SQLiteBackend):
+            print("--compact only applies to the SQLite backend")
+        else:
+            if queue.backend.enable_incremental_vacuum():
+                print("Converted the database to incremental auto-vacuum")
+            archived = queue.backend.compact(args.retention_days)
+            print(f"Archived {archived} tasks to {queue.backend.archive_dir}")
+    
+    elif args.reindex:
+        if not isinstance(queue.backend, RedisBackend):
+            print("--reindex only applies to the Redis backend")
+        else:
+            print(f"Indexed {queue.backend.rebuild_indexes()} tasks")
+    
     else:
         parser.print_help()
 
@@ -0,0 +1,44 @@
+"""Tests for task_queue.Scheduler"""
+
+import time
+from datetime import datetime
+
+from task_queue import Scheduler
+
+
+def created(seconds_ago: float) -> str:
+    return datetime.fromtimestamp(time.time() - seconds_ago).isoformat()
+
+
+def test_aged_bulk_tasks_do_not_pass_fresh_urgent_task():
+    scheduler = Scheduler({"aging_interval": 60})
+    candidates = [(f"docs{i}", "generate_docs", 9, created(15 * 60), None) for i in range(5)]
+    candidates.append(("urgent", "code_review", 0, created(0), None))
+
+    assert scheduler.select(candidates, 1) == ["urgent"]
+
+
+def test_aging_lifts_bulk_tasks_to_the_top_level_only():
+    scheduler = Scheduler({"aging_interval": 60})
+    now = time.time()
+
+    assert scheduler.effective_level(9, created(15 * 60), now) == 0
+    assert scheduler.effective_level(9, created(3 * 60 + 30), now) == 6
+
+
+def test_aged_bulk_task_passes_fresh_lower_priority_task():
+    scheduler = Scheduler({"aging_interval": 60})
+    candidates = [
+        ("normal", "code_review", 5, created(0), None),
+        ("docs", "generate_docs", 9, created(15 * 60), None),
+    ]
+
+    assert scheduler.select(candidates, 2) == ["docs", "normal"]
+
+
+def test_delayed_tasks_age_from_run_after():
+    scheduler = Scheduler({"aging_interval": 60})
+    now = time.time()
+
+    # Created an hour ago but only due two minutes ago
+    assert scheduler.effective_level(9, created(60 * 60), now, run_after=now - 150) == 7